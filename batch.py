@@ -0,0 +1,142 @@
+import io
+import csv
+import asyncio
+import itertools
+from html import escape
+from collections import deque, OrderedDict
+from typing import Union, Callable, Awaitable, AsyncIterator
+from aiogram.types import Message, BufferedInputFile, InlineKeyboardButton, InlineKeyboardMarkup
+from notifications import split_digest
+from core import html, calculate_error
+
+batch_limit = 100  # Строк в одном пакете
+file_size_limit = 256 * 1024
+concurrency = 4
+extensions = (".txt", ".csv")
+
+# Результат обработки одной строки: HTML для сообщения и значения для строки CSV
+Row = tuple[str, list]
+
+
+def is_batch(message: Message) -> bool:
+    return message.document is not None or "\n" in (message.text or "").strip()
+
+
+async def read_lines(message: Message) -> AsyncIterator[str]:
+    if message.document is None:
+        lines = message.text.splitlines()
+    else:
+        name = (message.document.file_name or "").lower()
+        content = (await message.bot.download(message.document)).read()
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = content.decode("cp1251")
+        if name.endswith(".csv"):
+            try:
+                dialect = csv.Sniffer().sniff(text[:1024], delimiters=",;\t")
+                header = csv.Sniffer().has_header(text[:1024])
+            except csv.Error:
+                dialect, header = csv.excel, False
+            rows = csv.reader(io.StringIO(text), dialect)
+            if header:
+                next(rows, None)
+            lines = (row[0] if row else "" for row in rows)
+        else:
+            lines = text.splitlines()
+
+    for line in itertools.islice(filter(None, map(str.strip, lines)), batch_limit):
+        yield line
+
+
+async def _result(line: str, task: asyncio.Future) -> tuple[str, Union[Row, Exception]]:
+    try:
+        return line, await task
+    except Exception as e:
+        return line, e
+
+
+# Строки обрабатываются конвейером: одновременно выполняется не больше limit заданий, результаты
+# выдаются в исходном порядке по мере готовности
+async def process(lines: AsyncIterator[str], function: Callable[[str], Awaitable[Row]],
+                  limit: int = concurrency) -> AsyncIterator[tuple[str, Union[Row, Exception]]]:
+    pending = deque()
+    try:
+        async for line in lines:
+            pending.append((line, asyncio.ensure_future(function(line))))
+            if len(pending) >= limit:
+                yield await _result(*pending.popleft())
+        while pending:
+            yield await _result(*pending.popleft())
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+async def answer_batch(message: Message, function: Callable[[str], Awaitable[Row]], columns: tuple[str, ...]):
+    if message.document is not None:
+        if not (message.document.file_name or "").lower().endswith(extensions):
+            return await message.answer("Для пакетного подсчета отправьте файл .txt или .csv: одна строка - "
+                                        "одна формула или уравнение")
+        if (message.document.file_size or 0) > file_size_limit:
+            return await message.answer(f"Файл слишком большой (максимум {file_size_limit // 1024} КБ)")
+
+    texts = []
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    number = 0
+    async for line, result in process(read_lines(message), function):
+        number += 1
+        if isinstance(result, Exception):
+            error = calculate_error(result)
+            texts.append(f"{number}. {escape(line)}\n{error}")
+            writer.writerow([line] + [""] * (len(columns) - 2) + [error])
+        else:
+            text, values = result
+            texts.append(f"{number}. {text}")
+            writer.writerow([line] + values + [""])
+
+    if number == 0:
+        return await message.answer("Не найдено ни одной строки для подсчета")
+    if message.document is not None:
+        name = message.document.file_name.rsplit(".", 1)[0]
+        document = BufferedInputFile(output.getvalue().encode("utf-8-sig"), filename=f"{name}_результаты.csv")
+        return await message.answer_document(document, caption=f"Обработано строк: {number}")
+    key = pages.put(split_digest("", texts, "\n\n"))
+    await message.answer(pages.get(key, 0), parse_mode=html, reply_markup=pages.markup(key, 0))
+
+
+# Страницы ответов на пакеты хранятся в памяти, старые вытесняются
+class pages:
+    max_size = 200
+    _pages: OrderedDict[str, list[str]] = OrderedDict()
+    _keys = itertools.count()
+
+    @staticmethod
+    def put(texts: list[str]) -> str:
+        key = str(next(pages._keys))
+        pages._pages[key] = texts
+        while len(pages._pages) > pages.max_size:
+            pages._pages.popitem(last=False)
+        return key
+
+    @staticmethod
+    def get(key: str, number: int) -> Union[str, None]:
+        texts = pages._pages.get(key)
+        if texts is None or not 0 <= number < len(texts):
+            return None
+        return texts[number]
+
+    @staticmethod
+    def markup(key: str, number: int) -> Union[InlineKeyboardMarkup, None]:
+        count = len(pages._pages.get(key, ()))
+        if count < 2:
+            return None
+        buttons = []
+        if number > 0:
+            buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"batch_page:{key}:{number - 1}"))
+        buttons.append(InlineKeyboardButton(text=f"{number + 1}/{count}", callback_data=f"batch_page:{key}:{number}"))
+        if number < count - 1:
+            buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"batch_page:{key}:{number + 1}"))
+        return InlineKeyboardMarkup(inline_keyboard=[buttons])
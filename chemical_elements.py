@@ -0,0 +1,248 @@
+from types import MappingProxyType
+from collections import namedtuple
+
+Element = namedtuple("Element", ("number", "symbol", "name", "genitive", "weight", "valences"))
+Ion = namedtuple("Ion", ("formula", "valence", "name"))
+
+# Символ, название, название в родительном падеже, относительная атомная масса (округленная, как в школьной
+# таблице) и возможные валентности; порядок строк совпадает с порядком атомных номеров
+_elements = (
+    ("H", "водород", "водорода", 1, (1,)),
+    ("He", "гелий", "гелия", 4, ()),
+    ("Li", "литий", "лития", 7, (1,)),
+    ("Be", "бериллий", "бериллия", 9, (2,)),
+    ("B", "бор", "бора", 11, (3,)),
+    ("C", "углерод", "углерода", 12, (2, 4)),
+    ("N", "азот", "азота", 14, (1, 2, 3, 4, 5)),
+    ("O", "кислород", "кислорода", 16, (2,)),
+    ("F", "фтор", "фтора", 19, (1,)),
+    ("Ne", "неон", "неона", 20, ()),
+    ("Na", "натрий", "натрия", 23, (1,)),
+    ("Mg", "магний", "магния", 24, (2,)),
+    ("Al", "алюминий", "алюминия", 27, (3,)),
+    ("Si", "кремний", "кремния", 28, (2, 4)),
+    ("P", "фосфор", "фосфора", 31, (3, 5)),
+    ("S", "сера", "серы", 32, (2, 4, 6)),
+    ("Cl", "хлор", "хлора", 35.5, (1, 3, 5, 7)),
+    ("Ar", "аргон", "аргона", 40, ()),
+    ("K", "калий", "калия", 39, (1,)),
+    ("Ca", "кальций", "кальция", 40, (2,)),
+    ("Sc", "скандий", "скандия", 45, (3,)),
+    ("Ti", "титан", "титана", 48, (2, 3, 4)),
+    ("V", "ванадий", "ванадия", 51, (2, 3, 4, 6)),
+    ("Cr", "хром", "хрома", 52, (2, 3, 6)),
+    ("Mn", "марганец", "марганца", 55, (2, 3, 4, 6, 7)),
+    ("Fe", "железо", "железа", 56, (2, 3)),
+    ("Co", "кобальт", "кобальта", 59, (2, 3)),
+    ("Ni", "никель", "никеля", 59, (2, 3, 4)),
+    ("Cu", "медь", "меди", 64, (1, 2)),
+    ("Zn", "цинк", "цинка", 65, (2,)),
+    ("Ga", "галлий", "галлия", 70, (3,)),
+    ("Ge", "германий", "германия", 73, (2, 4)),
+    ("As", "мышьяк", "мышьяка", 75, (3, 5)),
+    ("Se", "селен", "селена", 79, (2, 4, 6)),
+    ("Br", "бром", "брома", 80, (1, 3, 5, 7)),
+    ("Kr", "криптон", "криптона", 84, (2, 4, 6)),
+    ("Rb", "рубидий", "рубидия", 85, (1,)),
+    ("Sr", "стронций", "стронция", 88, (2,)),
+    ("Y", "иттрий", "иттрия", 89, (3,)),
+    ("Zr", "цирконий", "циркония", 91, (2, 3, 4)),
+    ("Nb", "ниобий", "ниобия", 93, (1, 2, 3, 4, 5)),
+    ("Mo", "молибден", "молибдена", 96, (2, 3, 4, 5, 6)),
+    ("Tc", "технеций", "технеция", 98, (1, 2, 3, 4, 5, 6, 7)),
+    ("Ru", "рутений", "рутения", 101, (2, 3, 4, 5, 6, 7, 8)),
+    ("Rh", "родий", "родия", 103, (1, 2, 3, 4, 5)),
+    ("Pd", "палладий", "палладия", 106, (1, 2, 3, 4)),
+    ("Ag", "серебро", "серебра", 108, (1, 2, 3)),
+    ("Cd", "кадмий", "кадмия", 112, (2,)),
+    ("In", "индий", "индия", 115, (3,)),
+    ("Sn", "олово", "олова", 119, (2, 4)),
+    ("Sb", "сурьма", "сурьмы", 122, (3, 5)),
+    ("Te", "теллур", "теллура", 128, (2, 4, 6)),
+    ("I", "йод", "йода", 127, (1, 3, 5, 7)),
+    ("Xe", "ксенон", "ксенона", 131, (2, 4, 6, 8)),
+    ("Cs", "цезий", "цезия", 133, (1,)),
+    ("Ba", "барий", "бария", 137, (2,)),
+    ("La", "лантан", "лантана", 139, (3,)),
+    ("Ce", "церий", "церия", 141, (3, 4)),
+    ("Pr", "празеодим", "празеодима", 141, (3, 4)),
+    ("Nd", "неодим", "неодима", 144, (3,)),
+    ("Pm", "прометий", "прометия", 145, (3,)),
+    ("Sm", "самарий", "самария", 150, (2, 3)),
+    ("Eu", "европий", "европия", 152, (2, 3)),
+    ("Gd", "гадолиний", "гадолиния", 157, (3,)),
+    ("Tb", "тербий", "тербия", 159, (3, 4)),
+    ("Dy", "диспрозий", "диспрозия", 163, (3,)),
+    ("Ho", "гольмий", "гольмия", 165, (3,)),
+    ("Er", "эрбий", "эрбия", 167, (3,)),
+    ("Tm", "тулий", "тулия", 169, (2, 3)),
+    ("Yb", "иттербий", "иттербия", 173, (2, 3)),
+    ("Lu", "лютеций", "лютеция", 175, (3,)),
+    ("Hf", "гафний", "гафния", 178, (2, 3, 4)),
+    ("Ta", "тантал", "тантала", 181, (1, 2, 3, 4, 5)),
+    ("W", "вольфрам", "вольфрама", 184, (2, 3, 4, 5, 6)),
+    ("Re", "рений", "рения", 186, (1, 2, 3, 4, 5, 6, 7)),
+    ("Os", "осмий", "осмия", 190, (2, 3, 4, 5, 6, 8)),
+    ("Ir", "иридий", "иридия", 192, (1, 2, 3, 4, 5, 6)),
+    ("Pt", "платина", "платины", 195, (1, 2, 3, 4, 5)),
+    ("Au", "золото", "золота", 197, (1, 2, 3)),
+    ("Hg", "ртуть", "ртути", 201, (2,)),
+    ("Tl", "таллий", "таллия", 204, (1, 3)),
+    ("Pb", "свинец", "свинца", 207, (2, 4)),
+    ("Bi", "висмут", "висмута", 209, (3, 5)),
+    ("Po", "полоний", "полония", 209, (2, 4, 6)),
+    ("At", "астат", "астата", 210, (1,)),
+    ("Rn", "радон", "радона", 222, ()),
+    ("Fr", "франций", "франция", 223, (1,)),
+    ("Ra", "радий", "радия", 226, (2,)),
+    ("Ac", "актиний", "актиния", 227, (3,)),
+    ("Th", "торий", "тория", 232, (2, 3, 4)),
+    ("Pa", "протактиний", "протактиния", 231, (4, 5)),
+    ("U", "уран", "урана", 238, (3, 4)),
+    ("Np", "нептуний", "нептуния", 237, (3, 4, 5, 6)),
+    ("Pu", "плутоний", "плутония", 244, (2, 3, 4)),
+    ("Am", "америций", "америция", 243, (3, 4, 5, 6)),
+    ("Cm", "кюрий", "кюрия", 247, (3, 4)),
+    ("Bk", "берклий", "берклия", 247, (3, 4)),
+    ("Cf", "калифорний", "калифорния", 251, (2, 3, 4)),
+    ("Es", "эйнштейний", "эйнштейния", 252, (2, 3)),
+    ("Fm", "фермий", "фермия", 257, (2, 3)),
+    ("Md", "менделевий", "менделевия", 258, (2, 3)),
+    ("No", "нобелий", "нобелия", 259, (2, 3)),
+    ("Lr", "лоуренсий", "лоуренсия", 260, (3,)),
+    ("Rf", "резерфордий", "резерфордия", 261, ()),
+    ("Db", "дубний", "дубния", 262, ()),
+    ("Sg", "сиборгий", "сиборгия", 266, ()),
+    ("Bh", "борий", "бория", 267, ()),
+    ("Hs", "хассий", "хассия", 269, ()),
+    ("Mt", "мейтнерий", "мейтнерия", 268, ()),
+    ("Ds", "дармштадтий", "дармштадтия", 271, ()),
+    ("Rg", "рентгений", "рентгения", 282, ()),
+    ("Cn", "коперниций", "коперниция", 285, ()),
+    ("Nh", "нихоний", "нихония", 286, ()),
+    ("Fl", "флеровий", "флеровия", 289, ()),
+    ("Mc", "московий", "московия", 288, ()),
+    ("Lv", "ливерморий", "ливермория", 293, ()),
+    ("Ts", "теннессин", "теннессина", 294, ()),
+    ("Og", "оганесон", "оганесона", 294, ()),
+)
+
+# Анионы (кислотные остатки и неметаллы): формула, валентность и название соли
+_ions = (
+    ("H", 1, "гидрид"),
+    ("B", 3, "борид"),
+    ("O", 2, "оксид"),
+    ("At", 1, "астатид"),
+    ("Br", 1, "бромид"),
+    ("S", 2, "сульфид"),
+    ("Cl", 1, "хлорид"),
+    ("F", 1, "фторид"),
+    ("I", 1, "иодид"),
+    ("C", 4, "карбид"),
+    ("N", 3, "нитрид"),
+    ("Si", 4, "силицид"),
+    ("P", 3, "фосфид"),
+    ("As", 3, "арсенид"),
+    ("Se", 2, "селенид"),
+    ("Te", 2, "теллурид"),
+    ("N₃", 1, "азид"),
+    ("CO₃", 2, "карбонат"),
+    ("NO₃", 1, "нитрат"),
+    ("NO₂", 1, "нитрит"),
+    ("OH", 1, "гидроксид"),
+    ("PO₄", 3, "фосфат (ортофосфат)"),
+    ("PO₃", 1, "метафосфат"),
+    ("SiO₃", 2, "силикат"),
+    ("SO₃", 2, "сульфит"),
+    ("SO₄", 2, "сульфат"),
+    ("BrO₂", 1, "бромит"),
+    ("BrO₃", 1, "бромат"),
+    ("BrO", 1, "гипобромит"),
+    ("VO₃", 1, "ванадат"),
+    ("WO₄", 2, "вольфрамат"),
+    ("BeO₄", 2, "бериллат"),
+    ("S₂O₇", 2, "дисульфат"),
+    ("P₂O₇", 4, "дифосфат (пирофосфат)"),
+    ("Cr₂O₇", 2, "дихромат"),
+    ("IO₄", 1, "периодат"),
+    ("IO", 1, "гипоиодит"),
+    ("MnO₄", 1, "перманганат"),
+    ("BO₂", 1, "метаборат"),
+    ("BO₃", 3, "борат"),
+    ("CrO₄", 2, "хромат"),
+    ("CN", 1, "цианид"),
+    ("AsO₂", 1, "метаарсенит"),
+    ("AsO₃", 3, "ортоарсенит"),
+    ("AsO₄", 3, "арсенат"),
+    ("C₂O₄", 2, "оксалат"),
+    ("ClO₂", 1, "хлорит"),
+    ("ClO₃", 1, "хлорат"),
+    ("ClO₄", 1, "перохлорат"),
+    ("ClO", 1, "гипохлорит"),
+    ("HCO₃", 1, "гидрокарбонат"),
+    ("HSO₄", 1, "гидросульфат"),
+    ("HSO₃", 1, "гидросульфит"),
+    ("HPO₄", 2, "гидрофосфат (гидроортофосфат)"),
+    ("H₂PO₄", 1, "дигидрофосфат (дигидроортофосфат)"),
+    ("HPO₃", 2, "фосфит"),
+    ("H₂PO₂", 1, "гипофосфит"),
+)
+
+elements: tuple[Element, ...] = (None,) + tuple(Element(number, *row) for number, row in enumerate(_elements, 1))
+by_symbol = MappingProxyType({element.symbol: element for element in elements[1:]})
+by_genitive = MappingProxyType({**{element.genitive: element for element in elements[1:]}, "иода": by_symbol["I"]})
+symbols = frozenset(by_symbol)
+
+ions = MappingProxyType({formula: Ion(formula, valence, name) for formula, valence, name in _ions})
+# Каждое слово названия соли ("фосфат (ортофосфат)") указывает на формулу аниона
+ion_by_name = MappingProxyType({word: ion.formula for ion in ions.values()
+                                for word in ion.name.replace("(", "").replace(")", "").split()})
+
+acids = MappingProxyType({
+    "HCl": "хлороводородная, или соляная,", "H₂S": "сероводородная", "H₂SO₃": "сернистая", "H₂SO₄": "серная",
+    "HNO₂": "азотистая", "HNO₃": "азотная", "H₂CO₃": "угольная", "H₂SiO₃": "кремниевая", "HBr": "бромоводородная",
+    "HF": "фтороводородная, или плавиковая,", "HI": "иодоводородная", "H₃PO₄": "ортофосфорная, или фосфорная,",
+    "HPO₃": "метафосфорная", "H₂BrO₂": "бромистая", "HBrO₃": "бромноватая",
+    "HBrO": "бромноватистая, или гипобромистая,", "HVO₃": "ванадиевая", "H₂WO₄": "вольфрамовая", "H₂S₂O₇": "дисерная",
+    "H₂Cr₂O₇": "дихромовая", "H₄P₂O₇": "дифосфорная, или пирофосфорная", "HIO₄": "иодная", "HIO": "иодноватистая",
+    "HMnO₄": "марганцовая", "HBO₂": "метаборная", "HAsO₂": "метамышьяковистая", "H₃BO₃": "ортоборная, или борная,",
+    "H₃AsO₃": "ортомышьяковистая", "H₃AsO₄": "ортомышьяковая", "H₂CrO₄": "хромовая", "H₂ClO₂": "хлористая",
+    "HClO₄": "хлорная", "HClO₃": "хлорноватая", "HClO": "хлорноватистая", "HCN": "циановодородная, или синильная,",
+    "H₂C₂O₄": "этандиовая, или щавельная,", "HN₃": "азотистоводородная"})
+acid_formulas = MappingProxyType({
+    "хлороводородная": "HCl", "соляная": "HCl", "сероводородная": "HS", "сернистая": "HSO", "серная": "HSO",
+    "азотистая": "HNO", "азотная": "HNO", "угольная": "HCO", "кремниевая": "HSiO", "бромоводородная": "HBr",
+    "фтороводородная": "HF", "плавиковая": "HF", "иодоводородная": "HI", "азотистоводородная": "HN",
+    "ортофосфорная": "HPO", "фосфорная": "HPO", "метафосфорная": "HPO", "бромистая": "HBrO", "бромноватая": "HBrO",
+    "бромноватистая": "HBrO", "гипобромистая": "HBrO", "ванадиевая": "HVO", "вольфрамовая": "HWO", "дисерная": "HSO",
+    "дифосфорная": "HPO", "пирофосфорная": "HPO", "дихромовая": "HCrO", "иодная": "HIO", "иодноватистая": "HIO",
+    "марганцовая": "HMnO", "метаборная": "HBO", "метамышьяковистая": "HAsO", "ортоборная": "HBO", "борная": "HBO",
+    "ортомышьяковистая": "HAsO", "ортомышьяковая": "HAsO", "хромовая": "HCrO", "хлористая": "HClO", "хлорная": "HClO",
+    "хлорноватая": "HClO", "хлорноватистая": "HClO", "синильная": "HCN", "циановодородная": "HCN", "этандиовая": "HCO",
+    "щавельная": "HCO"})
+
+simple_substances = MappingProxyType({
+    "O": "1. O₂ - кислород\n2. O₃ - озон", "H": "1. H₂ - водород", "N": "1. N₂ - азот", "F": "1. F₂ - фтор"})
+substance_formulas = MappingProxyType({
+    "кислород": "O", "озон": "O", "водород": "H", "азот": "N", "фтор": "F", "хлороводород": "HCl", "сероводород": "HS",
+    "бромистоводород": "HBr", "фтороводород": "HF", "иодоводород": "HI", "азотистоводород": "HN", "циановодород": "HCN"})
+
+# Ключи поиска кислотного остатка по элементам формулы (в порядке проверки) и варианты остатков
+base_ions_keys = (
+    "HPO", "HSO", "HCO", "ClO", "AsO", "CN", "BO", "MnO", "IO", "CrO", "BeO", "WO", "VO", "BrO", "SO", "SiO", "PO",
+    "OH", "NO", "CO", "F", "O", "Cl", "N", "Br", "I", "S", "Se", "C", "At", "H", "P", "As", "Te", "B", "Si")
+base_ions = MappingProxyType({
+    "H": "H", "B": "B", "O": "O", "At": "At", "Br": "Br", "S": "S", "Cl": "Cl", "F": "F", "I": "I", "C": "C",
+    "N": ("N", "N₃"), "Si": "Si", "P": "P", "As": "As", "Se": "Se", "Te": "Te", "CO": ("CO₃", "C₂O₄"),
+    "NO": ("NO₂", "NO₃"), "OH": ("OH",), "PO": ("PO₃", "PO₄", "P₂O₇"), "SiO": ("SiO₃",), "SO": ("SO₃", "SO₄", "S₂O₇"),
+    "BrO": ("BrO", "BrO₂", "BrO₃"), "VO": ("VO₃",), "WO": ("WO₄",), "BeO": ("BeO₄",), "CrO": ("CrO₄", "Cr₂O₇"),
+    "IO": ("IO", "IO₄"), "MnO": ("MnO₄",), "BO": ("BO₂", "BO₃"), "CN": ("CN",), "AsO": ("AsO₂", "AsO₃", "AsO₄"),
+    "ClO": ("ClO", "ClO₂", "ClO₃", "ClO₄"), "HCO": ("HCO₃",), "HSO": ("HSO₃", "HSO₄"),
+    "HPO": ("HPO₃", "HPO₄", "H₂PO₄", "H₂PO₂")})
+# Элементы в порядке возрастания электроотрицательности
+electronegativity = (
+    "Fr", "Cs", "K", "Rb", "Ba", "Ra", "Na", "Sr", "Li", "Ca", "La", "Ac", "Yb", "Ce", "Pr", "Pm", "Am", "Nd", "Sm",
+    "Gd", "Dy", "Y", "Er", "Tm", "Lu", "Cm", "Pu", "Th", "Bk", "Cf", "Es", "Fm", "Md", "No", "Hf", "Mg", "Zr", "Np",
+    "Sc", "U", "Ta", "Pa", "Ti", "Mn", "Be", "Nb", "Al", "Tl", "Zn", "V", "Cr", "Cd", "In", "Ga", "Fe", "Pb", "Co",
+    "Cu", "Re", "Si", "Tc", "Ni", "Ag", "Sn", "Hg", "Po", "Bi", "B", "Sb", "Te", "Mo", "As", "P", "H", "Ir", "Rn", "At",
+    "Ru", "Pd", "Os", "Pt", "Rh", "W", "Au", "C", "Se", "S", "Xe", "I", "Kr", "Br", "N", "Cl", "O", "F")
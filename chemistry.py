@@ -0,0 +1,152 @@
+import re
+import math
+from fractions import Fraction
+from collections import Counter
+from typing import Union
+from chemical_elements import symbols, by_symbol
+
+index_to_numbers = str.maketrans("₀₁₂₃₄₅₆₇₈₉", "0123456789")
+numbers_to_index = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
+superscript_to_numbers = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻", "0123456789+-")
+
+digits = frozenset("0123456789₀₁₂₃₄₅₆₇₈₉")
+hydrate_separators = frozenset("·•*.")
+opening_brackets = {"(": ")", "[": "]"}
+count_pattern = re.compile(r"(?<=[A-Za-z)\]])[0-9]+")
+charge_pattern = re.compile(r"(?:\^([0-9]*)([+-])|([⁰¹²³⁴⁵⁶⁷⁸⁹]*)([⁺⁻])|([+-]))$")
+
+
+class MultipleSolutions(ValueError):
+    pass
+
+
+# Количество атомов каждого элемента в порядке первого появления в формуле и заряд частицы
+class Composition(Counter):
+    def __init__(self, *args, charge: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.charge = charge
+
+
+# Разбор формулы за один проход: вложенные скобки, многозначные и подстрочные индексы, кристаллогидраты
+# (CuSO4·5H2O) и заряд в конце (SO4^2-, SO₄²⁻, OH-)
+def parse_formula(string: str) -> Composition:
+    string = string.strip()
+    charge = 0
+    if match := charge_pattern.search(string):
+        number, sign = match[1] or match[3] or "1", match[2] or match[4] or match[5]
+        charge = int(number.translate(superscript_to_numbers)) * (1 if sign in "+⁺" else -1)
+        string = string[:match.start()]
+
+    composition = Composition(charge=charge)
+    stack = [Counter()]
+    brackets = []
+    multiplier = 1
+    i = 0
+
+    def number(i: int) -> tuple[int, int]:
+        start = i
+        while i < len(string) and string[i] in digits:
+            i += 1
+        return (int(string[start:i].translate(index_to_numbers)) if i > start else 1), i
+
+    def add(group: Counter, count: int, to: Counter) -> None:
+        for element, n in group.items():
+            to[element] += n * count
+
+    while i < len(string):
+        char = string[i]
+        if "A" <= char <= "Z":
+            symbol = char
+            if i + 1 < len(string) and "a" <= string[i + 1] <= "z":
+                symbol += string[i + 1]
+            if symbol not in symbols:
+                raise ValueError(f"Unknown element: {symbol}")
+            count, i = number(i + len(symbol))
+            stack[-1][symbol] += count
+        elif char in opening_brackets:
+            brackets.append(opening_brackets[char])
+            stack.append(Counter())
+            i += 1
+        elif brackets and char == brackets[-1]:
+            brackets.pop()
+            group = stack.pop()
+            if not group:
+                raise ValueError("Empty group")
+            count, i = number(i + 1)
+            add(group, count, stack[-1])
+        elif char in hydrate_separators and not brackets and stack[0]:
+            add(stack[0], multiplier, composition)
+            multiplier, i = number(i + 1)
+            stack[0] = Counter()
+        else:
+            raise ValueError(f"Unexpected character: {char}")
+
+    if brackets:
+        raise ValueError("Unclosed group")
+    if not stack[0]:
+        raise ValueError("Empty formula")
+    add(stack[0], multiplier, composition)
+    return composition
+
+
+# Формула для вывода: индексы после элементов и скобок становятся подстрочными, множитель кристаллогидрата - нет
+def format_formula(string: str) -> str:
+    return count_pattern.sub(lambda number: number[0].translate(numbers_to_index), string)
+
+
+def molar_mass(composition: dict[str, int]) -> Union[int, float]:
+    mass = 0
+    for element, count in composition.items():
+        mass += count * by_symbol[element].weight
+    return mass
+
+
+# Коэффициенты реакции - наименьший целый вектор ядра матрицы состава (строки - элементы, столбцы - вещества,
+# продукты со знаком минус). Ядро ищется методом Гаусса в точной рациональной арифметике
+def balance(reactants: list[dict[str, int]], products: list[dict[str, int]]) -> list[int]:
+    def column_of(composition: dict[str, int], sign: int) -> dict[str, int]:
+        column = {element: sign * count for element, count in composition.items()}
+        column["+"] = sign * getattr(composition, "charge", 0)  # Заряд сохраняется так же, как атомы
+        return column
+
+    species = [column_of(reactant, 1) for reactant in reactants] + [column_of(product, -1) for product in products]
+    keys = list(dict.fromkeys(element for composition in species for element in composition))
+    matrix = [[Fraction(composition.get(element, 0)) for composition in species] for element in keys]
+
+    columns = len(species)
+    pivots = []
+    row = 0
+    for col in range(columns):
+        pivot = next((i for i in range(row, len(matrix)) if matrix[i][col]), None)
+        if pivot is None:
+            continue
+        matrix[row], matrix[pivot] = matrix[pivot], matrix[row]
+        value = matrix[row][col]
+        matrix[row] = [x / value for x in matrix[row]]
+        for i in range(len(matrix)):
+            if i != row and matrix[i][col]:
+                factor = matrix[i][col]
+                matrix[i] = [x - factor * y for x, y in zip(matrix[i], matrix[row])]
+        pivots.append(col)
+        row += 1
+
+    free = [col for col in range(columns) if col not in pivots]
+    if not free:
+        raise ValueError("Not a real reaction (Can't be balanced)")
+    if len(free) > 1:
+        raise MultipleSolutions("Reaction has several independent solutions")
+
+    solution = [Fraction(0)] * columns
+    solution[free[0]] = Fraction(1)
+    for i, col in enumerate(pivots):
+        solution[col] = -matrix[i][free[0]]
+
+    multiplier = math.lcm(*(x.denominator for x in solution))
+    coefficients = [int(x * multiplier) for x in solution]
+    divisor = math.gcd(*coefficients)
+    coefficients = [x // divisor for x in coefficients]
+    if all(x < 0 for x in coefficients):
+        coefficients = [-x for x in coefficients]
+    if any(x <= 0 for x in coefficients):
+        raise ValueError("Not a real reaction (Can't be balanced)")
+    return coefficients
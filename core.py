@@ -7,26 +7,348 @@ channel = "@tgmaksim_ru"
 markdown = "Markdown"
 html = "HTML"
 
+last_message_interval = 60  # Секунды между записями users.last_message одного пользователя
+prewarm_photos = False  # Загрузить все изображения в Telegram при запуске, чтобы заполнить кэш file_id
 
+
+import os
+import time
+import json
+import asyncio
 import sys_keys
 import aiosqlite
 import traceback
-from typing import Union
+from workers import TooComplex
+from chemistry import MultipleSolutions
+from collections import OrderedDict
+from typing import Union, Callable, Awaitable, Hashable, Any
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from aiogram.types import Message, CallbackQuery
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message, CallbackQuery, FSInputFile, InputMediaPhoto
 
 
 class db:
     db_path = "db.sqlite3"
+    readers_count = 3
+    cached_statements = 256
+
+    _writer: Union[aiosqlite.Connection, None] = None
+    _write_lock: Union[asyncio.Lock, None] = None
+    _readers: Union[asyncio.Queue, None] = None
+    _all_readers: list[aiosqlite.Connection] = []
+    _closed = False  # После close() база не переоткрывается запросами, пришедшими во время остановки
+
+    @staticmethod
+    async def _open() -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(resources_path(db.db_path), cached_statements=db.cached_statements)
+        await conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @staticmethod
+    async def connect() -> None:
+        if db._writer is not None:
+            return
+        db._closed = False
+        db._write_lock = asyncio.Lock()
+        db._writer = await db._open()
+        await db._writer.execute("PRAGMA journal_mode=WAL")
+        await db._writer.execute("PRAGMA synchronous=NORMAL")
+        db._readers = asyncio.Queue()
+        db._all_readers = []
+        for _ in range(db.readers_count):
+            conn = await db._open()
+            await conn.execute("PRAGMA query_only=ON")
+            db._all_readers.append(conn)
+            db._readers.put_nowait(conn)
+
+    @staticmethod
+    async def close() -> None:
+        if db._writer is None:
+            return
+        writer, readers = db._writer, db._all_readers
+        db._writer, db._readers, db._all_readers = None, None, []
+        db._closed = True
+        async with db._write_lock:
+            await writer.close()
+        for conn in readers:
+            await conn.close()
+
+    @staticmethod
+    @asynccontextmanager
+    async def transaction():
+        await db._ensure_connected()
+        async with db._write_lock:
+            writer = db._writer
+            if writer is None:  # close() начался, пока транзакция ждала блокировку
+                raise RuntimeError("Database is closed")
+            try:
+                yield writer
+                await writer.commit()
+            except BaseException:
+                await writer.rollback()
+                raise
+
+    @staticmethod
+    async def _ensure_connected() -> None:
+        if db._closed:
+            raise RuntimeError("Database is closed")
+        if db._writer is None:
+            await db.connect()
 
     @staticmethod
     async def execute(sql: str, params: tuple = tuple()) -> tuple[tuple]:
-        async with aiosqlite.connect(resources_path(db.db_path)) as conn:
-            async with conn.execute(sql, params) as cur:
-                result = await cur.fetchall()
-            await conn.commit()
+        await db._ensure_connected()
+        if sql.lstrip()[:6].upper() == "SELECT":
+            readers = db._readers
+            conn = await readers.get()
+            try:
+                return tuple(await conn.execute_fetchall(sql, params))
+            finally:
+                if db._readers is readers:  # Пул не закрыли, пока шел запрос
+                    readers.put_nowait(conn)
+        async with db.transaction() as conn:
+            return tuple(await conn.execute_fetchall(sql, params))
+
+    @staticmethod
+    async def execute_batch(batch: dict[str, list[tuple]]) -> None:
+        async with db.transaction() as conn:
+            for sql, rows in batch.items():
+                await conn.executemany(sql, rows)
+
+
+# Очередь отложенной записи логов: строки копятся в памяти и пишутся одной транзакцией
+class audit_log:
+    batch_size = 200
+    flush_interval = 0.5
+    max_queue = 10_000
+
+    _queue: Union[asyncio.Queue, None] = None
+    _task: Union[asyncio.Task, None] = None
+
+    @staticmethod
+    def start() -> None:
+        if audit_log._task is not None:
+            return
+        audit_log._queue = asyncio.Queue(audit_log.max_queue)
+        audit_log._task = asyncio.create_task(audit_log._worker())
+
+    @staticmethod
+    async def put(sql: str, params: tuple) -> None:
+        if audit_log._queue is None:
+            await db.execute(sql, params)
+            return
+        await audit_log._queue.put((sql, params))
+
+    @staticmethod
+    async def stop() -> None:
+        if audit_log._task is None:
+            return
+        task, audit_log._task = audit_log._task, None
+        await audit_log._queue.put(None)
+        await task
+        audit_log._queue = None
+
+    @staticmethod
+    async def _worker() -> None:
+        loop = asyncio.get_running_loop()
+        queue = audit_log._queue
+        stopping = False
+        while not stopping:
+            batch: dict[str, list[tuple]] = {}
+            count = 0
+            item = await queue.get()
+            deadline = loop.time() + audit_log.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                batch.setdefault(item[0], []).append(item[1])
+                count += 1
+                timeout = deadline - loop.time()
+                if count >= audit_log.batch_size or timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            while stopping and not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    batch.setdefault(item[0], []).append(item[1])
+            if not batch:
+                continue
+            try:
+                await db.execute_batch(batch)
+            except Exception:
+                traceback.print_exc()
+
+
+# Кэш file_id загруженных в Telegram изображений: путь к ресурсу -> (время изменения файла, file_id).
+# Изображение загружается с диска только первый раз и после изменения файла
+class photos:
+    paths: set[str] = set()
+    _file_ids: dict[str, tuple[float, str]] = {}
+
+    @staticmethod
+    def register(path: str) -> str:
+        photos.paths.add(path)
+        return path
+
+    @staticmethod
+    async def load() -> None:
+        photos._file_ids = {path: (mtime, file_id)
+                            for path, mtime, file_id in await db.execute("SELECT path, mtime, file_id FROM file_ids")}
+
+    @staticmethod
+    def _cached(path: str) -> tuple[float, Union[str, None]]:
+        mtime = os.stat(resources_path(path)).st_mtime
+        cached = photos._file_ids.get(path)
+        return mtime, cached[1] if cached and cached[0] == mtime else None
+
+    @staticmethod
+    async def _remember(path: str, mtime: float, file_id: str) -> None:
+        photos._file_ids[path] = (mtime, file_id)
+        await db.execute("INSERT INTO file_ids VALUES(?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                         "mtime=excluded.mtime, file_id=excluded.file_id", (path, mtime, file_id))
+
+    @staticmethod
+    async def send(send: Callable[[Union[str, FSInputFile]], Awaitable[Message]], path: str) -> Message:
+        mtime, file_id = photos._cached(path)
+        if file_id:
+            try:
+                return await send(file_id)
+            except TelegramBadRequest:  # file_id мог стать недействительным (например, у другого бота)
+                photos._file_ids.pop(path, None)
+        result = await send(FSInputFile(resources_path(path)))
+        await photos._remember(path, mtime, result.photo[-1].file_id)
         return result
 
+    @staticmethod
+    async def answer_photo(message: Message, path: str, **kwargs) -> Message:
+        return await photos.send(lambda photo: message.answer_photo(photo, **kwargs), path)
+
+    @staticmethod
+    async def answer_media_group(message: Message, paths: tuple[str, ...]) -> list[Message]:
+        cached = [photos._cached(path) for path in paths]
+        if all(file_id for _, file_id in cached):
+            try:
+                return await message.answer_media_group([InputMediaPhoto(media=file_id) for _, file_id in cached])
+            except TelegramBadRequest:
+                cached = [(mtime, None) for mtime, _ in cached]
+        result = await message.answer_media_group(
+            [InputMediaPhoto(media=file_id or FSInputFile(resources_path(path)))
+             for path, (_, file_id) in zip(paths, cached)])
+        for path, (mtime, _), sent in zip(paths, cached, result):
+            await photos._remember(path, mtime, sent.photo[-1].file_id)
+        return result
+
+    @staticmethod
+    async def prewarm(bot: Bot, chat_id: int) -> None:
+        for path in sorted(photos.paths):
+            if photos._cached(path)[1]:
+                continue
+            while True:
+                try:
+                    sent = await photos.send(lambda photo: bot.send_photo(chat_id, photo), path)
+                except TelegramRetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+                else:
+                    break
+            await sent.delete()
+            await asyncio.sleep(1)
+
+
+# LRU-кэш ограниченного размера поверх таблицы SQLite (key TEXT PRIMARY KEY, value TEXT): значения
+# хранятся в JSON и переживают перезапуск бота
+class PersistentCache:
+    def __init__(self, table: str, max_size: int = 1024):
+        self.table = table
+        self.max_size = max_size
+        self._values: OrderedDict[str, Any] = OrderedDict()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Any:
+        if key in self._values:
+            self._values.move_to_end(key)
+            self.hits += 1
+            return self._values[key]
+        rows = await db.execute(f"SELECT value FROM {self.table} WHERE key=?", (key,))
+        if not rows:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        value = json.loads(rows[0][0])
+        self._remember(key, value)
+        return value
+
+    # Запись сразу в базу, а не через очередь audit_log: при переполнении или остановке журнала кэш не
+    # должен ни ждать, ни терять значения
+    async def set(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        await db.execute(f"INSERT INTO {self.table} VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                         (key, json.dumps(value, ensure_ascii=False)))
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._values[key] = value
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._values), "max_size": self.max_size,
+                "hits": self.hits, "db_hits": self.db_hits, "misses": self.misses}
+
+
+# Кэш логических значений с разным временем жизни для True и False.
+# Одновременные запросы одного ключа ожидают один общий вызов loader. Хранится не больше max_size
+# значений: давно не запрошенные и устаревшие в начале очереди удаляются при добавлении
+class TTLCache:
+    def __init__(self, positive_ttl: float, negative_ttl: float, max_size: int = 10_000):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._values: OrderedDict[Hashable, tuple[bool, float]] = OrderedDict()
+        self._pending: dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[bool]]) -> bool:
+        cached = self._values.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            self._values.move_to_end(key)
+            return cached[0]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = bool(await loader())
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Ошибка уже передана вызывающему, ожидающих может не быть
+            raise
+        else:
+            ttl = self.positive_ttl if value else self.negative_ttl
+            self._remember(key, value, time.monotonic() + ttl)
+            future.set_result(value)
+            return value
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def _remember(self, key: Hashable, value: bool, expires: float) -> None:
+        self._values[key] = (value, expires)
+        self._values.move_to_end(key)
+        now = time.monotonic()
+        while self._values and (len(self._values) > self.max_size or next(iter(self._values.values()))[1] <= now):
+            self._values.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._values.pop(key, None)
+
 
 def security(*arguments):
     def new_decorator(fun):
@@ -42,16 +364,23 @@ def security(*arguments):
     return new_decorator
 
 
+def calculate_error(e: Exception) -> str:
+    if isinstance(e, TooComplex):
+        return "Слишком сложные данные: не удалось посчитать за отведенное время"
+    elif isinstance(e, MultipleSolutions):
+        return "Реакцию можно уравнять несколькими независимыми способами: уточните вещества или " \
+               "разделите ее на отдельные реакции"
+    elif e.args and e.args[0] == "Not a real reaction (Can't be balanced)":
+        return "Ваша реакция не корректна или не существует!"
+    return "Вы неправильно ввели данные для подсчета"
+
+
 def except_calculate(fun):
     async def new(data, state):
         try:
             await fun(data, state)
         except Exception as e:
-            if e.args[0] == "Not a real reaction (Can't be balanced)":
-                text = "Ваша реакция не корректна или не существует!"
-            else:
-                text = "Вы неправильно ввели данные для подсчета"
-            await data.answer(text)
+            await data.answer(calculate_error(e))
 
     return new
 
@@ -73,6 +402,10 @@ async def get_users() -> set:
     return set(map(lambda x: int(x[0]), await db.execute("SELECT id FROM users")))
 
 
+async def get_acquaintances() -> dict[int, str]:
+    return {int(id): name for id, name in await db.execute("SELECT id, name FROM acquaintances")}
+
+
 async def get_version():
     return (await db.execute("SELECT value FROM system_data WHERE key=?", ("version",)))[0][0]
 
@@ -2,31 +2,52 @@
 import re
 import math
 import itertools
+from functools import lru_cache
+from collections import namedtuple
 from typing import Union, Literal
-from chemlib import Reaction, Compound
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from core import resources_path, except_calculate
-from physical_quantities import Volume, round, Weight
+from chemical_elements import (
+    ions,
+    acids,
+    by_symbol,
+    base_ions,
+    by_genitive,
+    ion_by_name,
+    acid_formulas,
+    base_ions_keys,
+    electronegativity,
+    simple_substances,
+    substance_formulas,
+)
+from chemistry import balance, molar_mass, parse_formula, format_formula, index_to_numbers, numbers_to_index
+from search import Vocabulary
+from workers import ProcessPool
+from expressions import evaluate
+from batch import is_batch, answer_batch
+from core import photos, except_calculate, PersistentCache
+from physical_quantities import Volume, round, Weight, render, to_exact
 from aiogram.types import (
     Message,
-    FSInputFile,
     CallbackQuery,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
 
 
+# Уравнивание реакций выполняется в отдельных процессах, чтобы сложное уравнение не блокировало бота
+balance_pool = ProcessPool(size=2, timeout=3)
+
+
 class DataPath:
+    __slots__ = ('_path',)
+
     def __init__(self, *path: str):
         self._path = path
 
     @property
     def data(self) -> Union['EducationalData', 'EducationalInformation', 'EducationalFunction', None]:
-        data = functions
-        for i in self._path:
-            data = data.__getitem__(i)
-        return data
+        return index[".".join(self._path)]
 
     @property
     def parent(self) -> Union['DataPath', None]:
@@ -45,6 +66,8 @@ html: Literal['HTML'] = "HTML"
 
 
 class DataEducationalInformation:
+    __slots__ = ('_data',)
+
     def __init__(self, data):
         self._data = data
 
@@ -52,11 +75,17 @@ class DataEducationalInformation:
     def data(self):
         return self._data
 
+    def back_markup(self, data_path: DataPath) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text="<<<Назад", callback_data=data_path.parent.path)]])
+
     def __bool__(self) -> bool:
         return bool(self._data)
 
 
 class TextEducationalInformation(DataEducationalInformation):
+    __slots__ = ('_parse_mode',)
+
     def __init__(self, text: str, parse_mode: Literal['Markdown', 'HTML'] = markdown):
         super().__init__(text)
         self._parse_mode = parse_mode
@@ -65,29 +94,35 @@ class TextEducationalInformation(DataEducationalInformation):
     def parse_mode(self) -> str:
         return self._parse_mode
 
-    async def __call__(self, message: Message, data_path: DataPath):
-        markup = InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text="<<<Назад", callback_data=data_path.parent.path)]])
+    async def __call__(self, message: Message, markup: InlineKeyboardMarkup):
         await message.edit_text(self.data, parse_mode=self._parse_mode, reply_markup=markup)
 
 
 class PhotoEducationalInformation(DataEducationalInformation):
+    __slots__ = ('_text',)
+
     def __init__(self, path: str, text: TextEducationalInformation = TextEducationalInformation('')):
-        super().__init__(FSInputFile(resources_path(path)))
+        super().__init__(photos.register(path))
         self._text = text
 
-    async def __call__(self, message: Message, data_path: DataPath):
-        markup = InlineKeyboardMarkup(
+    def back_markup(self, data_path: DataPath) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(
             inline_keyboard=[[InlineKeyboardButton(text="<<<Назад", callback_data="_del" + data_path.parent.path)]])
+
+    async def __call__(self, message: Message, markup: InlineKeyboardMarkup):
         await message.delete()
-        await message.answer_photo(self.data, self._text.data, parse_mode=self._text.parse_mode, reply_markup=markup)
+        await photos.answer_photo(message, self.data, caption=self._text.data, parse_mode=self._text.parse_mode,
+                                  reply_markup=markup)
 
 
 class EducationalInformation:
+    __slots__ = ('_data_path', '_text', '_inf', '_markup')
+
     def __init__(self, text: str, inf: Union[TextEducationalInformation, str, PhotoEducationalInformation]):
         self._data_path = DataPath()
         self._text = text
         self._inf = inf if not isinstance(inf, str) else Text(inf)
+        self._markup = None
 
     @property
     def data_path(self) -> DataPath:
@@ -96,6 +131,13 @@ class EducationalInformation:
     @data_path.setter
     def data_path(self, value: DataPath) -> None:
         self._data_path = value
+        self._markup = None
+
+    @property
+    def markup(self) -> InlineKeyboardMarkup:
+        if self._markup is None:
+            self._markup = self._inf.back_markup(self._data_path)
+        return self._markup
 
     @property
     def inline_keyboard_button(self) -> 'InlineKeyboardButton':
@@ -105,15 +147,18 @@ class EducationalInformation:
         )
 
     async def __call__(self, message, _=None):
-        await self._inf(message, self._data_path)
+        await self._inf(message, self.markup)
 
 
 class EducationalData:
+    __slots__ = ('_text', '_data_path', '_button_row', '_datas', '_markup')
+
     def __init__(self, text: Union[str, None], data_path: DataPath, buttons_row: int = 2,
                  **datas: Union['EducationalData', 'EducationalInformation', 'EducationalFunction']):
         self._text = text
         self._data_path = data_path
         self._button_row = buttons_row
+        self._markup = None
         self._datas = {}
         if not isinstance(self, BackEducationalData):
             self._datas['back'] = BackEducationalData(self._data_path.parent)
@@ -125,6 +170,9 @@ class EducationalData:
     def __getitem__(self, item: str) -> Union['EducationalData', 'EducationalInformation', 'EducationalFunction']:
         return self._datas[item]
 
+    def items(self):
+        return ((key, data) for key, data in self._datas.items() if key != 'back')
+
     @property
     def inline_keyboard_buttons(self) -> list[list['InlineKeyboardButton']]:
         buttons = [child.inline_keyboard_button for child in self._datas.values()]
@@ -133,6 +181,12 @@ class EducationalData:
             result.append(buttons[i: min(len(buttons), i + self._button_row)])
         return result
 
+    @property
+    def markup(self) -> InlineKeyboardMarkup:
+        if self._markup is None:
+            self._markup = InlineKeyboardMarkup(inline_keyboard=self.inline_keyboard_buttons)
+        return self._markup
+
     @property
     def inline_keyboard_button(self) -> 'InlineKeyboardButton':
         return InlineKeyboardButton(
@@ -141,14 +195,15 @@ class EducationalData:
         )
 
     async def __call__(self, message: Message, new: bool = False):
-        markup = InlineKeyboardMarkup(inline_keyboard=self.inline_keyboard_buttons)
         if new:
-            await message.answer("Выберите раздел или понятие", reply_markup=markup)
+            await message.answer("Выберите раздел или понятие", reply_markup=self.markup)
         else:
-            await message.edit_text("Выберите раздел или понятие", reply_markup=markup)
+            await message.edit_text("Выберите раздел или понятие", reply_markup=self.markup)
 
 
 class BackEducationalData(EducationalData):
+    __slots__ = ()
+
     def __init__(self, data_path: DataPath):
         super().__init__(
             text="Назад",
@@ -157,6 +212,8 @@ class BackEducationalData(EducationalData):
 
 
 class ResultCalculate:
+    __slots__ = ('_answer', '_result', '_i')
+
     def __init__(self, answer: str, result: Union[str, int, float]):
         self._answer = answer
         self._result = result
@@ -206,26 +263,29 @@ class calculate_chemistry:
     @staticmethod
     @except_calculate
     async def molecular_weight(message: Message, _):
-        await message.answer(molecular_weight(message.text, get_elements(message.text)).answer, parse_mode=html)
+        if is_batch(message):
+            await answer_batch(message, molecular_weight_row, ("Формула", "Mr", "Название", "Ошибка"))
+        else:
+            await message.answer(molecular_weight(message.text, parse_formula(message.text)).answer, parse_mode=html)
         await functions['calculate_chemistry']['molecular_weight'].function(message)
 
     @staticmethod
     @except_calculate
     async def mass_fraction1(message: Message, state: FSMContext):
-        elements = get_elements(message.text)
-        await state.update_data(elements=elements, string=message.text)
+        composition = parse_formula(message.text)
+        await state.update_data(composition=dict(composition), string=message.text)
         await state.set_state(UserState.mass_fraction2)
         markup = InlineKeyboardMarkup(inline_keyboard=[[
-            InlineKeyboardButton(text=element, callback_data=element)] for element in set(elements)])
+            InlineKeyboardButton(text=element, callback_data=element)] for element in composition])
         await message.answer("Выберите элемент", reply_markup=markup)
 
     @staticmethod
     async def mass_fraction2(callback_query: CallbackQuery, state: FSMContext):
-        elements = (await state.get_data())['elements']
+        composition = (await state.get_data())['composition']
         string = (await state.get_data())['string']
         await state.clear()
         await state.set_state(UserState.mass_fraction1)
-        await callback_query.message.edit_text(mass_fraction(string, callback_query.data, elements).answer,
+        await callback_query.message.edit_text(mass_fraction(string, callback_query.data, composition).answer,
                                                parse_mode=html)
         await functions['calculate_chemistry']['mass_fraction'].function(callback_query.message)
 
@@ -292,17 +352,44 @@ class task_chemistry:
     @staticmethod
     @except_calculate
     async def making_formulas_by_name(message: Message, _):
-        await message.answer(making_formulas_by_name(message.text), parse_mode=html)
+        try:
+            answer = making_formulas_by_name(message.text)
+        except (KeyError, IndexError):
+            suggestions = suggest_names(message.text)
+            if not suggestions:
+                raise
+            if len(suggestions) > 1 and suggestions[0][0] == suggestions[1][0]:  # Несколько одинаково близких
+                markup = InlineKeyboardMarkup(inline_keyboard=[[
+                    InlineKeyboardButton(text=name, callback_data=name_callback_data(name))]
+                    for _, name in suggestions])
+                return await message.answer("Возможно, вы имели в виду:", reply_markup=markup)
+            name = suggestions[0][1]
+            answer = f"<i>{name.capitalize()}</i>\n{making_formulas_by_name(name)}"
+        await message.answer(answer, parse_mode=html)
         await functions['task_chemistry']['making_formulas_by_name'].function(message)
 
+    @staticmethod
+    @except_calculate
+    async def making_formulas_by_name_suggestion(callback_query: CallbackQuery, _):
+        name = " ".join(name_words[int(i)] for i in callback_query.data.removeprefix("name:").split("."))
+        await callback_query.message.edit_text(f"<i>{name.capitalize()}</i>\n{making_formulas_by_name(name)}",
+                                               parse_mode=html)
+        await functions['task_chemistry']['making_formulas_by_name'].function(callback_query.message)
+
     @staticmethod
     @except_calculate
     async def setting_coefficients(message: Message, _):
-        await message.answer(setting_coefficients(message.text), parse_mode=html)
+        if is_batch(message):
+            await answer_batch(message, setting_coefficients_row,
+                               ("Уравнение", "Коэффициенты", "Тип реакции", "Сумма коэффициентов", "Ошибка"))
+        else:
+            await message.answer(await setting_coefficients(message.text), parse_mode=html)
         await functions['task_chemistry']['setting_coefficients'].function(message)
 
 
 class EducationalFunction:
+    __slots__ = ('_text', '_data_path', '_state', '_function')
+
     def __init__(self, text: str, data_path: DataPath, state: State, function):
         self._text = text
         self._data_path = data_path
@@ -329,136 +416,175 @@ class EducationalFunction:
         )
 
 
-def setting_coefficients(string: str):
+async def setting_coefficients(string: str):
     if "=" not in string:
         return "Уравнение некорректно! Нет знака равно (=)"
 
-    answer, type_reaction, suma = calculate_equation(string.replace("=", ">"))
+    return render_equation(*await calculate_equation(string.replace("=", ">")))
+
 
+def render_equation(answer: str, type_reaction: str, suma: int) -> str:
     def build_number(text: str):
-        for key in ["2", "3", "4", "5", "6", "7", "8", "9"]:
-            text = text.replace(key, f"<b>{key}</b>")
-        return text
+        # Выделяются только коэффициенты (в начале вещества), а не множитель кристаллогидрата
+        return re.sub(r"(?:^|(?<= ))[0-9]+", lambda number: f"<b>{number[0]}</b>", text)
 
     return f"{build_number(answer)}\n" \
            f"Тип реакции: <b>{type_reaction}</b>\n" \
            f"Сумма коэффициентов реакции: <b>{suma}</b>"
 
 
-def calculate_equation(string: str):
-    numbers_to_index = {"1": "", "2": "₂", "3": "₃", "4": "₄", "5": "₅", "6": "₆", "7": "₇", "8": "₈",
-                        "9": "₉"}
-    text = "".join(numbers_to_index.get(i, i) for i in string)
-    list_reactants = [element.strip() for element in text.split(">")[0].split("+")]
-    list_products = [element.strip() for element in text.split(">")[1].split("+")]
+async def setting_coefficients_row(line: str) -> tuple[str, list]:
+    if "=" not in line:
+        raise ValueError("No equals sign")
+    answer, type_reaction, suma = await calculate_equation(line.replace("=", ">"))
+    return render_equation(answer, type_reaction, suma), [answer, type_reaction, suma]
+
+
+async def molecular_weight_row(line: str) -> tuple[str, list]:
+    answer, result = molecular_weight(line, parse_formula(line))
+    return answer, [result, compounds.name(line) or ""]
+
+
+equations = PersistentCache("equations")
+
+
+def species_key(species: str) -> str:
+    return "".join(species.split()).translate(index_to_numbers)
 
-    reaction = Reaction.by_formula(text)
-    reactants: list[Compound] = reaction.reactants
-    products: list[Compound] = reaction.products
+
+def equation_key(reactants: list[str], products: list[str]) -> Union[str, None]:
+    reactants = sorted(map(species_key, reactants))
+    products = sorted(map(species_key, products))
+    if len(set(reactants)) != len(reactants) or len(set(products)) != len(products):
+        return None
+    return "+".join(reactants) + "=" + "+".join(products)
+
+
+# Результат уравнивания не зависит от порядка веществ и пробелов, поэтому уравнение запоминается по
+# нормализованному ключу, а коэффициенты - по веществам
+async def calculate_equation(string: str):
+    list_reactants = [element.strip() for element in string.split(">")[0].split("+")]
+    list_products = [element.strip() for element in string.split(">")[1].split("+")]
+
+    key = equation_key(list_reactants, list_products)
+    cached = await equations.get(key) if key is not None else None
+    if cached is None:
+        coefficients, type_reaction = await balance_pool.run(balance_equation, string)
+        cached = {"coefficients": dict(zip(map(species_key, list_reactants + list_products), coefficients)),
+                  "type": type_reaction}
+        if key is not None:
+            await equations.set(key, cached)
+
+    coefficients = [cached["coefficients"][species_key(species)] for species in list_reactants + list_products]
+    list_reactants = [("" if coefficient == 1 else str(coefficient)) + format_formula(species)
+                      for coefficient, species in zip(coefficients, list_reactants)]
+    list_products = [("" if coefficient == 1 else str(coefficient)) + format_formula(species)
+                     for coefficient, species in zip(coefficients[len(list_reactants):], list_products)]
+
+    answer = " + ".join(list_reactants) + " = " + " + ".join(list_products)
+
+    return answer, cached["type"], sum(coefficients)
+
+
+def balance_equation(string: str) -> tuple[list[int], str]:
+    reactants = [parse_formula(species) for species in string.split(">")[0].split("+")]
+    products = [parse_formula(species) for species in string.split(">")[1].split("+")]
 
     if len(reactants) > 1 and len(products) == 1:
         type_reaction = "соединение"
     elif len(reactants) == 1 and len(products) > 1:
         type_reaction = "разложение"
-    elif False not in [len(set_number) > 1 for set_number in [set([element.properties['AtomicNumber']
-                                                                   for element in reactant.elements])
-                                                              for reactant in reactants]] and \
-            False not in [len(set_number) > 1 for set_number in [set([element.properties['AtomicNumber']
-                                                                      for element in reactant.elements])
-                                                                 for reactant in reactants]]:
+    elif all(len(reactant) > 1 for reactant in reactants):
         type_reaction = "обмен"
     else:
         type_reaction = "замещение"
 
-    reaction.balance()
-
-    coefficients = [str(number).replace("1", "") for number in list(reaction.coefficients.values())]
-    list_reactants = [coefficients[i] + r for i, r in enumerate(list_reactants)]
-    list_products = [coefficients[i + len(list_reactants)] + r for i, r in enumerate(list_products)]
-
-    answer = " + ".join(list_reactants) + " = " + " + ".join(list_products)
-
-    return answer, type_reaction, sum(list(reaction.coefficients.values()))
+    return balance(reactants, products), type_reaction
+
+
+# Словари слов названий: по ним исправляются опечатки и дописываются сокращенные слова
+salt_names = Vocabulary(ion_by_name)
+# Предлагаются только элементы, для которых бот может составить формулу (есть валентности и место в ряду
+# электроотрицательности), иначе выбранная подсказка заканчивается ошибкой
+genitive_names = Vocabulary(genitive for genitive, element in by_genitive.items()
+                            if element.valences and element.symbol in electronegativity)
+acid_names = Vocabulary(acid_formulas)
+acid_word = Vocabulary(("кислота",))
+substance_names = Vocabulary(substance_formulas)
+# Номера слов для callback_data (64 байта не хватает на название кириллицей)
+name_words = tuple(sorted(salt_names.words | genitive_names.words | acid_names.words | acid_word.words |
+                          substance_names.words))
+name_word_numbers = {word: number for number, word in enumerate(name_words)}
+
+
+def normalize_name(string: str) -> list[str]:
+    return string.lower().replace("ё", "е").split()
+
+
+def name_callback_data(name: str) -> str:
+    return "name:" + ".".join(str(name_word_numbers[word]) for word in name.split())
+
+
+# Ближайшие к введенному названия (с суммарным числом исправлений) при любом порядке слов
+def suggest_names(string: str, limit: int = 3) -> list[tuple[int, str]]:
+    words = normalize_name(string)
+    variants = {}
+
+    def add(name: str, distance: int) -> None:
+        variants[name] = min(distance, variants.get(name, distance))
+
+    if len(words) == 1:
+        for distance, substance in substance_names.match(words[0]):
+            add(substance, distance)
+    elif len(words) == 2:
+        for first, second in (words, words[::-1]):
+            for (distance, salt), (second_distance, genitive) in itertools.product(
+                    salt_names.match(first), genitive_names.match(second)):
+                add(f"{salt} {genitive}", distance + second_distance)
+            for (distance, acid), (second_distance, word) in itertools.product(
+                    acid_names.match(first), acid_word.match(second)):
+                add(f"{acid} {word}", distance + second_distance)
+    names = buildable_names()
+    return sorted((distance, name) for name, distance in variants.items() if name in names)[:limit]
+
+
+# Названия, для которых бот составляет формулы, определяются один раз (при запуске, после compounds.build):
+# подсказки выбираются только из них, и варианты не проверяются при каждом запросе
+@lru_cache(maxsize=1)
+def buildable_names() -> frozenset[str]:
+    names = {f"{acid} кислота" for acid in acid_names.words} | substance_names.words
+    for salt, genitive in itertools.product(salt_names.words, genitive_names.words):
+        try:
+            compounds.get(ion_by_name[salt] + by_genitive[genitive].symbol)
+        except (KeyError, ValueError):  # Сочетание, для которого бот не составляет формулы
+            continue
+        names.add(f"{salt} {genitive}")
+    return frozenset(names)
 
 
 def making_formulas_by_name(string: str):
-    element_to_simple_subs = \
-        {"O": "1. O₂ - кислород\n2. O₃ - озон", "H": "1. H₂ - водород", "N": "1. N₂ - азот", "F": "1. F₂ - фтор"}
-    name_sub_to_formula = \
-        {"кислород": "O", "озон": "O", "водород": "H", "азот": "N", "фтор": "F", "хлороводород": "HCl",
-         "сероводород": "HS", "бромистоводород": "HBr", "фтороводород": "HF", "иодоводород": "HI",
-         "азотистоводород": "HN", "циановодород": "HCN"}
-    compound_to_formula = \
-        {"гидрид": "H", "борид": "B", "оксид": "O", "астатид": "At",
-         "бромид": "Br", "сульфид": "S", "хлорид": "Cl", "фторид": "F", "иодид": "I", "карбид": "C", "нитрид": "N",
-         "силицид": "Si", "фосфид": "P", "арсенид": "As", "селенид": "Se", "теллурид": "Te", "карбонат": "CO₃",
-         "нитрат": "NO₃", "нитрит": "NO₂", "гидроксид": "OH", "фосфат": "PO₄", "ортофосфат": "PO₄", "метафосфат": "PO₃",
-         "силикат": "SiO₃", "сульфит": "SO₃", "сульфат": "SO₄", "бромит": "BrO₂", "бромат": "BrO₃", "гипобромит": "BrO",
-         "ванадат": "VO₃", "вольфрамат": "WO₄", "бериллат": "BeO₄", "дисульфат": "S₂O₇",
-         "дифосфат": "P₂O₇", "пирофосфат": "P₂O₇", "дихромат": "Cr₂O₇", "периодат": "IO₄", "гипоиодит": "IO",
-         "перманганат": "MnO₄", "метаборат": "BO₂", "борат": "BO₃", "хромат": "CrO₄", "цианид": "CN",
-         "метаарсенит": "AsO₂", "ортоарсенит": "AsO₃", "арсенат": "AsO₄", "оксалат": "C₂O₄", "хлорит": "ClO₂",
-         "хлорат": "ClO₃", "перохлорат": "ClO₄", "гипохлорит": "ClO", "гидрокарбонат": "HCO₃", "гидросульфат": "HSO₄",
-         "гидросульфит": "HSO₃", "гидрофосфат": "HPO₄", "гидроортофосфат": "HPO₄", "азид": "N₃",
-         "дигидрофосфат": "H₂PO₄", "дигидроортофосфат": "H₂PO₄", "фосфит": "HPO₃", "гипофосфит": "H₂PO₂"}
-    genitive_elements2 = \
-        {"водорода": "H", "лития": "Li", "бериллия": "Be", "бора": "B", "углерода": "C", "азота": "N", "кислорода": "O",
-         "фтора": "F", "натрия": "Na", "магния": "Mg", "алюминия": "Al", "кремния": "Si", "фосфора": "P", "серы": "S",
-         "хлора": "Cl", "калия": "K", "кальция": "Ca", "скандия": "Sc", "титана": "Ti", "вандия": "V", "хрома": "Cr",
-         "марганца": "Mn", "железа": "Fe", "кобальта": "Co", "никеля": "Ni", "меди": "Cu", "цинка": "Zn", "галия": "Ga",
-         "германия": "Ge", "мышьяка": "As", "селена": "Se", "брома": "Br", "рубидия": "Rb", "стронция": "Sr",
-         "иттрия": "Y", "циркония": "Zr", "ниобия": "Nb", "молибдена": "Mo", "технеция": "Tc", "Рутения": "Ru",
-         "родия": "Rh", "палладия": "Pd", "серебра": "Ag", "кадмия": "Cd", "индия": "In", "олова": "Sn", "сурьмы": "Sb",
-         "теллура": "Te", "йода": "I", "цезия": "Cs", "бария": "Ba", "гафния": "Hf", "тантала": "Ta", "вольфрама": "W",
-         "рения": "Re", "осмия": "Os", "иридия": "Ir", "платины": "Pt", "золота": "Au", "ртути": "Hg", "талия": "Tl",
-         "свинца": "Pb", "висмута": "Bi", "полония": "Po", "астата": "At", "франция": "Fr", "радия": "Ra",
-         "резерфордия": "Rf", "дубния": "Db", "сиборгия": "Sg", "бория": "Bh", "хассия": "Hs", "мейтнерия": "Mt",
-         "дармштадтия": "Ds", "рентгения": "Rg", "коперниция": "Cn", "нихония": "Nh", "флеровия": "Fl",
-         "московия": "Mc", "ливермория": "Lv", "теннессина": "Ts", "оганесона": "Og", "лантана": "La", "церия": "Ce",
-         "празеодима": "Pr", "неодима": "Nd", "прометия": "Pm", "самария": "Sm", "европия": "Eu", "гадолиния": "Gd",
-         "тербия": "Tb", "диспрозия": "Dy", "гольмия": "Ho", "эрбия": "Er", "тулия": "Tm", "иттербия": "Yb",
-         "лютеция": "Lu", "актиния": "Ac", "тория": "Th", "протактиния": "Pa", "урана": "U", "нептуния": "Np",
-         "плутония": "Pu", "америция": "Am", "кюрия": "Cm", "берклия": "Bk", "калифорния": "Cf", "эйнштейния": "Es",
-         "фермия": "Fm", "менделевия": "Md", "нобелия": "No", "лоуренция": "Lr"}
-    acid_to_formula = \
-        {"хлороводородная": "HCl", "соляная": "HCl", "сероводородная": "HS", "сернистая": "HSO", "серная": "HSO",
-         "азотистая": "HNO", "азотная": "HNO", "угольная": "HCO", "кремниевая": "HSiO", "бромоводородная": "HBr",
-         "фтороводородная": "HF", "плавиковая": "HF", "иодоводородная": "HI", "азотистоводородная": "HN",
-         "ортофосфорная": "HPO", "фосфорная": "HPO", "метафосфорная": "HPO", "бромистая": "HBrO",
-         "бромноватая": "HBrO", "бромноватистая": "HBrO", "гипобромистая": "HBrO", "ванадиевая": "HVO",
-         "вольфрамовая": "HWO", "дисерная": "HSO", "дифосфорная": "HPO", "пирофосфорная": "HPO",
-         "дихромовая": "HCrO", "иодная": "HIO", "иодноватистая": "HIO", "марганцовая": "HMnO", "метаборная": "HBO",
-         "метамышьяковистая": "HAsO", "ортоборная": "HBO", "борная": "HBO", "ортомышьяковистая": "HAsO",
-         "ортомышьяковая": "HAsO", "хромовая": "HCrO", "хлористая": "HClO", "хлорная": "HClO",
-         "хлорноватая": "HClO", "хлорноватистая": "HClO", "синильная": "HCN", "циановодородная": "HCN",
-         "этандиовая": "HCO", "щавельная": "HCO"}
     _compound_to_formula = None
-    if element_to_simple_subs.get(name_sub_to_formula.get(string.lower())):
-        return element_to_simple_subs[name_sub_to_formula[string.lower()]]
-    if name_sub_to_formula.get(string.lower()):
-        text = name_sub_to_formula[string.lower()]
+    text = normalize_name(string)
+    string = " ".join(text)
+    if simple_substances.get(substance_formulas.get(string)):
+        return simple_substances[substance_formulas[string]]
+    if substance_formulas.get(string):
+        text = substance_formulas[string]
     else:
-        text = string.lower().split(" ")
-        if compound_to_formula.get(text[0]):
+        if ion_by_name.get(text[0]):
             _compound_to_formula = text[:]
-            text = compound_to_formula[text[0]] + genitive_elements2[text[1]]
-        elif compound_to_formula.get(text[1]):
+            text = ion_by_name[text[0]] + by_genitive[text[1]].symbol
+        elif ion_by_name.get(text[1]):
             _compound_to_formula = text[::-1]
-            text = compound_to_formula[text[1]] + genitive_elements2[text[0]]
-        elif acid_to_formula.get(text[0]):
-            text = acid_to_formula[text[0]]
+            text = ion_by_name[text[1]] + by_genitive[text[0]].symbol
+        elif acid_formulas.get(text[0]):
+            text = acid_formulas[text[0]]
         else:
-            text = acid_to_formula[text[1]]
-    answer = ""
-    base_elements, del_element = get_base_element(text)
-    elements = get_elements(text, True)
-    [elements.remove(element) for element in get_elements(del_element, True)]
-    if len(elements) != 1:
+            text = acid_formulas[text[1]]
+    variants = compounds.get(text)
+    if variants is None:
         return "К сожалению, я не могу посчитать индексы для этого вещества"
-    i = 0
-    for base_element in base_elements:
-        answer += count_indexes([valence(element) for element in elements], list(elements), base_element, i)
-        i = len(answer.split("\n")) // 2 - 1
+    answer = render_compounds(variants)
 
     if _compound_to_formula is not None:
         answer = answer.split('\n')
@@ -473,376 +599,201 @@ def making_formulas_by_name(string: str):
 
 
 def formulation_of_chemical_formulas(string: str) -> str:
-    element_to_simple_subs = \
-        {"O": "1. O₂ - кислород\n2. O₃ - озон", "H": "1. H₂ - водород", "N": "1. N₂ - азот", "F": "1. F₂ - фтор"}
-    if element_to_simple_subs.get(string):
-        return element_to_simple_subs[string]
-    answer = ""
-    base_elements, del_element = get_base_element(string)
-    elements = get_elements(string, True)
-    [elements.remove(element) for element in get_elements(del_element, True)]
-    if len(elements) != 1:
+    if simple_substances.get(string):
+        return simple_substances[string]
+    variants = compounds.get(string)
+    if variants is None:
         return "К сожалению, я не могу посчитать индексы для этого вещества"
-    i = 0
-    for base_element in base_elements:
-        answer += count_indexes([valence(element) for element in elements], list(elements), base_element, i)
-        i = len(answer.split("\n")) // 2
-    return answer
+    return render_compounds(variants)
 
 
-def count_indexes(valences_elements: list, elements: list, base: str, i: int = 0):
-    valence_ions = \
-        {"H": 1, "B": 3, "O": 2, "At": 1,
-         "Br": 1, "S": 2, "Cl": 1, "F": 1, "I": 1, "C": 4, "N": 3, "Si": 4, "P": 3, "As": 3, "Se": 2, "Te": 2,
-         "CO₃": 2, "NO₃": 1, "NO₂": 1, "OH": 1, "PO₄": 3, "PO₃": 1, "SiO₃": 2, "SO₃": 2, "SO₄": 2,
-         "BrO₂": 1, "BrO₃": 1, "BrO": 1, "VO₃": 1, "WO₄": 2, "BeO₄": 2, "S₂O₇": 2, "P₂O₇": 4, "Cr₂O₇": 2,
-         "IO₄": 1, "IO": 1, "MnO₄": 1, "BO₂": 1, "BO₃": 3, "CrO₄": 2, "CN": 1, "AsO₂": 1, "AsO₃": 3, "AsO₄": 3,
-         "C₂O₄": 2, "ClO₂": 1, "ClO₃": 1, "ClO₄": 1, "ClO": 1, "HCO₃": 1, "HSO₄": 1, "HSO₃": 1, "HPO₄": 2, "H₂PO₄": 1,
-         "HPO₃": 2, "H₂PO₂": 1, "N₃": 1}
-    number_to_index = \
-        {"1": "", "2": "₂", "3": "₃", "4": "₄", "5": "₅", "6": "₆", "7": "₇", "8": "₈", "9": "₉"}
-    numbers_to_index = \
-        {"1": "₁", "2": "₂", "3": "₃", "4": "₄", "5": "₅", "6": "₆", "7": "₇", "8": "₈", "9": "₉"}
-    valence_to_number = {1: "ₗ", 2: "ₗₗ", 3: "ₗₗₗ", 4: "ₗᵥ", 5: "ᵥ", 6: "ᵥₗ", 7: "ᵥₗₗ", 8: "ᵥₗₗₗ"}
-    tabul = '\t'
-    nti = lambda number: number_to_index[number] if int(number) < 10 \
-        else "".join([numbers_to_index[n] for n in number])
-    elements.append(base)
-    list_elements = list(elements)
-    elements2 = list(elements)
+# Элементы каждого ключа кислотного остатка (в порядке проверки) и место элемента в ряду электроотрицательности
+ion_elements = {ion: frozenset(parse_formula(ion)) for ion in base_ions_keys}
+electronegativity_rank = {element: rank for rank, element in enumerate(electronegativity)}
+
+
+# Вещество из элемента и кислотного остатка: формула, строка валентностей над ней и название
+Compound = namedtuple("Compound", ("formula", "valence_line", "name"))
+
+
+# Все вещества, которые бот может составить, строятся один раз при запуске (compounds.build) и ищутся по набору
+# элементов формулы; при промахе (или до построения) варианты вычисляются как раньше
+class compounds:
+    _variants: dict[frozenset[str], tuple[tuple[Compound, ...], ...]] = {}
+    _names: dict[str, str] = {}
+
+    @staticmethod
+    def build() -> None:
+        for element in by_symbol.values():
+            if not element.valences:
+                continue
+            for ion in base_ions_keys:
+                try:
+                    variants = compounds._calculate(element.symbol + ion)
+                except (ValueError, KeyError):  # Сочетание, для которого бот не составляет формулы
+                    continue
+                if variants is None:
+                    continue
+                compounds._variants[frozenset(parse_formula(element.symbol + ion))] = variants
+                for compound in itertools.chain(*variants):
+                    compounds._names.setdefault(compound.formula.translate(index_to_numbers), compound.name)
+
+    @staticmethod
+    def _calculate(string: str) -> Union[tuple[tuple[Compound, ...], ...], None]:
+        composition = parse_formula(string)
+        base_elements, del_element = get_base_element(frozenset(composition))
+        _elements = [element for element in composition if element not in ion_elements[del_element]]
+        if len(_elements) != 1:
+            return None
+        return tuple(tuple(count_indexes([valence(element) for element in _elements], _elements, base_element))
+                     for base_element in base_elements)
+
+    @staticmethod
+    def get(string: str) -> Union[tuple[tuple[Compound, ...], ...], None]:
+        variants = compounds._variants.get(frozenset(parse_formula(string)))
+        return variants if variants is not None else compounds._calculate(string)
+
+    # Название по готовой формуле: "Fe2(SO4)3", "Fe₂(SO₄)₃" -> "сульфат железа (III)"
+    @staticmethod
+    def name(formula: str) -> Union[str, None]:
+        return compounds._names.get("".join(formula.split()).translate(index_to_numbers))
+
+
+def render_compounds(variants: tuple[tuple[Compound, ...], ...]) -> str:
     answer = ""
-    valence_base_element = [valence_ions.get(base)]
-    if not valence_base_element[0]:
-        valence_base_element = valence(base)
-    valences_elements.append(valence_base_element)
-    for valences in itertools.product(*valences_elements):
-        lcm = get_lcm(*valences)
-        coefficients = [int(lcm / i) for i in valences]
-        for element in list_elements:
-            if len(get_elements(list_elements[list_elements.index(element)], True)) > 1 or \
-                    list_elements[list_elements.index(element)][-1] in numbers_to_index.values():
-                add1, add2 = ("(", ")") if nti(str(coefficients[list_elements.index(element)])) else ("", "")
-                elements[list_elements.index(element)] = \
-                    f"{add1}{list_elements[list_elements.index(element)]}{add2}" \
-                    f"{nti(str(coefficients[list_elements.index(element)]))}"
-            else:
-                elements[list_elements.index(element)] = list_elements[list_elements.index(element)] + \
-                                                         nti(str(coefficients[list_elements.index(element)]))
-        i += 1
+    for i, compound in enumerate(itertools.chain(*variants), 1):
         if i == 1: answer += "Ответ:\n"
-        answer += f"{'  ' * (len(str(i)) + 2)}{tabul * (math.ceil(len(elements[0]) / 2))}" \
-                  f"{valence_to_number[valences[0]]}" \
-                  f"{tabul * (math.ceil(len(elements[0]) / 2))}" \
-                  f"{tabul * (math.ceil(len(elements[1]) / 2 + 1))}" \
-                  f"{valence_to_number[valences[1]]}\n"
-        answer += f"{i}. " + "".join(elements) + get_name_compound(
-            list(elements), list(elements2), base, valences[:-1], True) + "\n"
+        answer += f"{'  ' * (len(str(i)) + 2)}{compound.valence_line}\n{i}. {compound.formula} - {compound.name}\n"
     return answer
 
 
+valence_to_number = {1: "ₗ", 2: "ₗₗ", 3: "ₗₗₗ", 4: "ₗᵥ", 5: "ᵥ", 6: "ᵥₗ", 7: "ᵥₗₗ", 8: "ᵥₗₗₗ"}
+
+
+def count_indexes(valences_elements: list, elements: list, base: str) -> list[Compound]:
+    tabul = '\t'
+    elements = elements + [base]
+    # Многоатомные остатки (SO₄, OH) при индексе больше 1 берутся в скобки
+    groups = [len(parse_formula(element)) > 1 or element[-1] in "₀₁₂₃₄₅₆₇₈₉" for element in elements]
+    valences_elements = valences_elements + [[ions[base].valence] if base in ions else valence(base)]
+    formulas = set()
+    result = []
+    for valences in itertools.product(*valences_elements):
+        lcm = math.lcm(*valences)
+        parts = []
+        for element, group, _valence in zip(elements, groups, valences):
+            index = "" if lcm == _valence else str(lcm // _valence).translate(numbers_to_index)
+            parts.append(f"({element}){index}" if group and index else element + index)
+        formula = "".join(parts)
+        if formula in formulas:  # Разные наборы валентностей могут дать одну и ту же формулу
+            continue
+        formulas.add(formula)
+        valence_line = f"{tabul * (math.ceil(len(parts[0]) / 2))}" \
+                       f"{valence_to_number[valences[0]]}" \
+                       f"{tabul * (math.ceil(len(parts[0]) / 2))}" \
+                       f"{tabul * (math.ceil(len(parts[1]) / 2 + 1))}" \
+                       f"{valence_to_number[valences[1]]}"
+        result.append(Compound(formula, valence_line, get_name_compound(parts, elements, base, valences[:-1])))
+    return result
+
+
 def get_name_compound(elements, elements2: list, base: str, valences_elements: tuple, add_space: bool = False):
-    ions = \
-        {"H": "гидрид", "B": "борид", "O": "оксид", "At": "астатид",
-         "Br": "бромид", "S": "сульфид", "Cl": "хлорид", "F": "фторид", "I": "иодид", "C": "карбид", "N": "нитрид",
-         "Si": "силицид", "P": "фосфид", "As": "арсенид", "Se": "селенид", "Te": "теллурид", "N₃": "азид",
-         "CO₃": "карбонат", "NO₃": "нитрат", "NO₂": "нитрит", "OH": "гидроксид",
-         "PO₄": "фосфат (ортофосфат)", "PO₃": "метафосфат", "SiO₃": "силикат", "SO₃": "сульфит", "SO₄": "сульфат",
-         "BrO₂": "бромит", "BrO₃": "бромат", "BrO": "гипобромит", "VO₃": "ванадат", "WO₄": "вольфрамат",
-         "BeO₄": "бериллат", "S₂O₇": "дисульфат", "P₂O₇": "дифосфат (пирофосфат)",
-         "Cr₂O₇": "дихромат", "IO₄": "периодат", "IO": "гипоиодит", "MnO₄": "перманганат",
-         "BO₂": "метаборат", "BO₃": "борат", "CrO₄": "хромат", "CN": "цианид",
-         "AsO₂": "метаарсенит", "AsO₃": "ортоарсенит", "AsO₄": "арсенат", "C₂O₄": "оксалат",
-         "ClO₂": "хлорит", "ClO₃": "хлорат", "ClO₄": "перохлорат", "ClO": "гипохлорит",
-         "HCO₃": "гидрокарбонат", "HSO₄": "гидросульфат", "HSO₃": "гидросульфит",
-         "HPO₄": "гидрофосфат (гидроортофосфат)", "H₂PO₄": "дигидрофосфат (дигидроортофосфат)",
-         "HPO₃": "фосфит", "H₂PO₂": "гипофосфит"}
-    genitive_elements = \
-        {"H": "водорода", "Li": "лития", "Be": "бериллия", "B": "бора", "C": "углерода", "N": "азота", "O": "кислорода",
-         "F": "фтора", "Na": "натрия", "Mg": "магния", "Al": "алюминия", "Si": "кремния", "P": "фосфора", "S": "серы",
-         "Cl": "хлора", "K": "калия", "Ca": "кальция", "Sc": "скандия", "Ti": "титана", "V": "вандия", "Cr": "хрома",
-         "Mn": "марганца", "Fe": "железа", "Co": "кобальта", "Ni": "никеля", "Cu": "меди", "Zn": "цинка", "Ga": "галия",
-         "Ge": "германия", "As": "мышьяка", "Se": "селена", "Br": "брома", "Rb": "рубидия", "Sr": "стронция",
-         "Y": "иттрия", "Zr": "циркония", "Nb": "ниобия", "Mo": "молибдена", "Tc": "технеция", "Ru": "Рутения",
-         "Rh": "родия", "Pd": "палладия", "Ag": "серебра", "Cd": "кадмия", "In": "индия", "Sn": "олова", "Sb": "сурьмы",
-         "Te": "теллура", "I": "йода", "Cs": "цезия", "Ba": "бария", "Hf": "гафния", "Ta": "тантала", "W": "вольфрама",
-         "Re": "рения", "Os": "осмия", "Ir": "иридия", "Pt": "платины", "Au": "золота", "Hg": "ртути", "Tl": "талия",
-         "Pb": "свинца", "Bi": "висмута", "Po": "полония", "At": "астата", "Fr": "франция", "Ra": "радия",
-         "Rf": "резерфордия", "Db": "дубния", "Sg": "сиборгия", "Bh": "бория", "Hs": "хассия", "Mt": "мейтнерия",
-         "Ds": "дармштадтия", "Rg": "рентгения", "Cn": "коперниция", "Nh": "нихония", "Fl": "флеровия",
-         "Mc": "московия", "Lv": "ливермория", "Ts": "теннессина", "Og": "оганесона",
-         "La": "лантана", "Ce": "церия", "Pr": "празеодима", "Nd": "неодима", "Pm": "прометия", "Sm": "самария",
-         "Eu": "европия", "Gd": "гадолиния", "Tb": "тербия", "Dy": "диспрозия", "Ho": "гольмия", "Er": "эрбия",
-         "Tm": "тулия", "Yb": "иттербия", "Lu": "лютеция",
-         "Ac": "актиния", "Th": "тория", "Pa": "протактиния", "U": "урана", "Np": "нептуния", "Pu": "плутония",
-         "Am": "америция", "Cm": "кюрия", "Bk": "берклия", "Cf": "калифорния", "Es": "эйнштейния", "Fm": "фермия",
-         "Md": "менделевия", "No": "нобелия", "Lr": "лоуренция"}
-    names_acids = \
-        {"HCl": "хлороводородная, или соляная,", "H₂S": "сероводородная", "H₂SO₃": "сернистая", "H₂SO₄": "серная",
-         "HNO₂": "азотистая", "HNO₃": "азотная", "H₂CO₃": "угольная", "H₂SiO₃": "кремниевая",
-         "HBr": "бромоводородная", "HF": "фтороводородная, или плавиковая,", "HI": "иодоводородная",
-         "H₃PO₄": "ортофосфорная, или фосфорная,", "HPO₃": "метафосфорная",
-         "H₂BrO₂": "бромистая", "HBrO₃": "бромноватая", "HBrO": "бромноватистая, или гипобромистая,",
-         "HVO₃": "ванадиевая", "H₂WO₄": "вольфрамовая", "H₂S₂O₇": "дисерная", "H₂Cr₂O₇": "дихромовая",
-         "H₄P₂O₇": "дифосфорная, или пирофосфорная", "HIO₄": "иодная", "HIO": "иодноватистая",
-         "HMnO₄": "марганцовая", "HBO₂": "метаборная", "HAsO₂": "метамышьяковистая", "H₃BO₃": "ортоборная, или борная,",
-         "H₃AsO₃": "ортомышьяковистая", "H₃AsO₄": "ортомышьяковая", "H₂CrO₄": "хромовая", "H₂ClO₂": "хлористая",
-         "HClO₄": "хлорная", "HClO₃": "хлорноватая", "HClO": "хлорноватистая", "HCN": "циановодородная, или синильная,",
-         "H₂C₂O₄": "этандиовая, или щавельная,", "HN₃": "азотистоводородная"}
     add = " - " if add_space else ""
     numbers = {1: "I", 2: "II", 3: "III", 4: "IV", 5: "V", 6: "VI", 7: "VII", 8: "VIII"}
-    name_compound = ions.get(base)
+    name_compound = ions[base].name
     _valence = f" ({numbers[valences_elements[0]]})" if len(valence(elements2[0])) != 1 else ""
-    result = f"{add}{name_compound} {genitive_elements[elements2[0]]}{_valence}"
+    result = f"{add}{name_compound} {by_symbol[elements2[0]].genitive}{_valence}"
 
-    if names_acids.get("".join(elements)):
-        result += f" ({names_acids.get(''.join(elements))} кислота)"
+    if acids.get("".join(elements)):
+        result += f" ({acids.get(''.join(elements))} кислота)"
 
     return result
 
 
-def get_lcm(x: int, y: int, *args) -> int:
-    if x > y:
-        greater = x
-    else:
-        greater = y
-    while True:
-        if (greater % x == 0) and (greater % y == 0):
-            lcm = greater
-            break
-        greater += 1
-    return lcm if not args else get_lcm(lcm, args[0], *args[1:])
+def valence(element: str) -> list[int]:
+    valences = by_symbol[element].valences
+    if not valences:  # Благородные газы и сверхтяжелые элементы
+        raise ValueError(f"No valences for {element}")
+    return list(valences)
 
 
-def valence(element: str) -> list[int]:
-    valences = \
-        {"H": [1], "He": 0, "Li": [1], "Be": [2], "B": [3], "C": [2, 4], "N": [1, 2, 3, 4, 5], "O": [2], "F": [1],
-         "Ne": 0, "Na": [1], "Mg": [2], "Al": [3], "Si": [2, 4], "P": [3, 5], "S": [2, 4, 6], "Cl": [1, 3, 5, 7],
-         "Ar": 0, "K": [1], "Ca": [2], "Sc": [3], "Ti": [2, 3, 4], "V": [2, 3, 4, 6], "Cr": [2, 3, 6],
-         "Mn": [2, 3, 4, 6, 7], "Fe": [2, 3], "Co": [2, 3], "Ni": [2, 3, 4], "Cu": [1, 2], "Zn": [2], "Ga": [3],
-         "Ge": [2, 4], "As": [3, 5], "Se": [2, 4, 6], "Br": [1, 3, 5, 7], "Kr": [2, 4, 6], "Rb": [1], "Sr": [2],
-         "Y": [3], "Zr": [2, 3, 4], "Nb": [1, 2, 3, 4, 5], "Mo": [2, 3, 4, 5, 6], "Tc": [1, 2, 3, 4, 5, 6, 7],
-         "Ru": [2, 3, 4, 5, 6, 7, 8], "Rh": [1, 2, 3, 4, 5], "Pd": [1, 2, 3, 4], "Ag": [1, 2, 3], "Cd": [2], "In": [3],
-         "Sn": [2, 4], "Sb": [3, 5], "Te": [2, 4, 6], "I": [1, 3, 5, 7], "Xe": [2, 4, 6, 8], "Cs": [1], "Ba": [2],
-         "Hf": [2, 3, 4], "Ta": [1, 2, 3, 4, 5], "W": [2, 3, 4, 5, 6], "Re": [1, 2, 3, 4, 5, 6, 7],
-         "Os": [2, 3, 4, 5, 6, 8], "Ir": [1, 2, 3, 4, 5, 6], "Pt": [1, 2, 3, 4, 5], "Au": [1, 2, 3], "Hg": [2],
-         "Tl": [1, 3], "Pb": [2, 4], "Bi": [3, 5], "Po": [2, 4, 6], "At": [1], "Rn": 0, "Fr": [1], "Ra": [2],
-
-         # Лантаноиды
-         "La": [3], "Ce": [3, 4], "Pr": [3, 4], "Nd": [3], "Pm": [3], "Sm": [2, 3], "Eu": [2, 3], "Gd": [3],
-         "Tb": [3, 4], "Dy": [3], "Ho": [3], "Er": [3], "Tm": [2, 3], "Yb": [2, 3], "Lu": [3],
-
-         # Актиноиды
-         "Ac": [3], "Th": [2, 3, 4], "Pa": [4, 5], "U": [3, 4], "Np": [3, 4, 5, 6], "Pu": [2, 3, 4], "Am": [3, 4, 5, 6],
-         "Cm": [3, 4], "Bk": [3, 4], "Cf": [2, 3, 4], "Es": [2, 3], "Fm": [2, 3], "Md": [2, 3], "No": [2, 3], "Lr": [3]}
-
-    return list(valences[element])
-
-
-def get_base_element(string: str):
-    base_ions_keys = \
-        ("HPO", "HSO", "HCO", "ClO", "AsO", "CN", "BO", "MnO", "IO", "CrO", "BeO", "WO", "VO", "BrO", "SO", "SiO", "PO",
-         "OH", "NO", "CO", "F", "O", "Cl", "N", "Br", "I", "S", "Se", "C", "At", "H", "P", "As", "Te", "B", "Si")
-    electronegativity = \
-        ("Fr", "Cs", "K", "Rb", "Ba", "Ra", "Na", "Sr", "Li", "Ca", "La", "Ac", "Yb", "Ce", "Pr", "Pm", "Am", "Nd",
-         "Sm", "Gd", "Dy", "Y", "Er", "Tm", "Lu", "Cm", "Pu", "Th", "Bk", "Cf", "Es", "Fm", "Md", "No", "Hf", "Mg",
-         "Zr", "Np", "Sc", "U", "Ta", "Pa", "Ti", "Mn", "Be", "Nb", "Al", "Tl", "Zn", "V", "Cr", "Cd", "In", "Ga", "Fe",
-         "Pb", "Co", "Cu", "Re", "Si", "Tc", "Ni", "Ag", "Sn", "Hg", "Po", "Bi", "B", "Sb", "Te", "Mo", "As", "P", "H",
-         "Ir", "Rn", "At", "Ru", "Pd", "Os", "Pt", "Rh", "W", "Au", "C", "Se", "S", "Xe", "I", "Kr", "Br", "N", "Cl",
-         "O", "F")
-    base_ions = \
-        {"H": "H", "B": "B", "O": "O", "At": "At", "Br": "Br", "S": "S", "Cl": "Cl", "F": "F", "I": "I", "C": "C",
-         "N": ["N", "N₃"], "Si": "Si", "P": "P", "As": "As", "Se": "Se", "Te": "Te",
-         "CO": ["CO₃", "C₂O₄"], "NO": ["NO₂", "NO₃"], "OH": ["OH"], "PO": ["PO₃", "PO₄", "P₂O₇"], "SiO": ["SiO₃"],
-         "SO": ["SO₃", "SO₄", "S₂O₇"], "BrO": ["BrO", "BrO₂", "BrO₃"], "VO": ["VO₃"], "WO": ["WO₄"],
-         "BeO": ["BeO₄"], "CrO": ["CrO₄", "Cr₂O₇"], "IO": ["IO", "IO₄"], "MnO": ["MnO₄"], "BO": ["BO₂", "BO₃"],
-         "CN": ["CN"], "AsO": ["AsO₂", "AsO₃", "AsO₄"], "ClO": ["ClO", "ClO₂", "ClO₃", "ClO₄"],
-         "HCO": ["HCO₃"], "HSO": ["HSO₃", "HSO₄"], "HPO": ["HPO₃", "HPO₄", "H₂PO₄", "H₂PO₂"]}
-    variants_base_element = []
-    base_ion = ""
-    for ion in base_ions_keys:
-        bool_ion = True
-        for i in get_elements(ion, True):
-            if i not in get_elements(string, True):
-                bool_ion = False
-        if bool_ion and sorted(get_elements(ion, True)) != \
-                sorted(get_elements(string, True)):
-            base_ion = ion
-            variants_base_element.append(base_ions[ion])
+def get_base_element(composition: frozenset[str]) -> tuple[list[str], str]:
+    for ion, _elements in ion_elements.items():
+        if _elements < composition:
+            if isinstance(base_ions[ion], tuple):
+                return list(base_ions[ion]), ion
             break
-    for element in variants_base_element:
-        if type(element) == list:
-            return element, base_ion
-    variants_base_element = get_elements(string, True)
-    base_element = electronegativity[max(*[electronegativity.index(element) for element in variants_base_element])]
-    if base_element not in base_ions_keys:
+    if not composition <= electronegativity_rank.keys():
+        raise ValueError
+    base_element = max(composition, key=electronegativity_rank.__getitem__)
+    if base_element not in base_ions:
         raise ValueError
     return [base_element], base_element
 
 
 def gas_density(string: str) -> ResultCalculate:
-    number_to_index = {"1": "₁", "2": "₂", "3": "₃", "4": "₄", "5": "₅", "6": "₆", "7": "₇", "8": "₈",
-                       "9": "₉"}
-    nti = lambda i: "".join([number_to_index.get(j, j) for j in i])
-    answer, mass = molecular_weight(string, get_elements(string))
-    answer += f"\nρ({nti(string)}) = M({nti(string)}) / Vm = {mass} г/моль / 22.4 л/моль = " \
+    answer, mass = molecular_weight(string, parse_formula(string))
+    answer += f"\nρ({format_formula(string)}) = M({format_formula(string)}) / Vm = {mass} г/моль / 22.4 л/моль = " \
               f"<b>{round(mass / 22.4)} г/л</b>"
     result = round(mass / 22.4)
     return ResultCalculate(answer, result)
 
 
 def amount_of_substance_from_volume_of_gas(volume: str) -> ResultCalculate:
-    answer = f"n = V / Vm\nn = {volume} / 22.4 л/моль = <b>{round(Volume(volume).get_volume('л') / 22.4)} моль</b>"
-    result = round(Volume(volume).get_volume('л') / 22.4)
-    return ResultCalculate(answer, result)
+    n = Volume(volume).get_volume('л', exact=True) / to_exact(22.4)
+    answer = f"n = V / Vm\nn = {volume} / 22.4 л/моль = <b>{render(n)} моль</b>"
+    return ResultCalculate(answer, round(n))
 
 
 def amount_of_substance_from_number_of_particles(string: str) -> ResultCalculate:
-    number: int = eval(string, {"__builtins__": {}}, {})
-    number = int(number) if int(number) == number else number
+    number = evaluate(string)
+    n = to_exact(number) / (to_exact(6.02) * 10 ** 23)
     answer = f"n = N / Nₐ = {string} / 6.02 * 10²³ моль⁻¹ = " \
-             f"<b>{round(number / (6.02 * 10 ** 23))}моль</b>"
+             f"<b>{render(n)}моль</b>"
 
-    return ResultCalculate(answer, round(number / (6.02 * 10 ** 23)))
+    return ResultCalculate(answer, round(n))
 
 
 def amount_of_substance_from_mass(weight: str, string: str) -> ResultCalculate:
-    number_to_index = {"1": "₁", "2": "₂", "3": "₃", "4": "₄", "5": "₅", "6": "₆", "7": "₇", "8": "₈",
-                       "9": "₉"}
-    nti = lambda i: "".join([number_to_index.get(j, j) for j in i])
     weight = Weight(weight)
-    Mr = molecular_weight(string, get_elements(string)).result
-    answer = f"1. M({nti(string)}) = Mr({nti(string)}) г/моль = {Mr} г/моль\n" \
-             f"2. n({nti(string)}) = m / M = {weight} / {Mr}г/моль = " \
-             f"<b>{round(weight.get_mass('г') / Mr)}моль</b>"
+    Mr = molecular_weight(string, parse_formula(string)).result
+    n = weight.get_mass('г', exact=True) / to_exact(Mr)
+    answer = f"1. M({format_formula(string)}) = Mr({format_formula(string)}) г/моль = {Mr} г/моль\n" \
+             f"2. n({format_formula(string)}) = m / M = {weight} / {Mr}г/моль = " \
+             f"<b>{render(n)}моль</b>"
 
-    return ResultCalculate(answer, round(weight.get_mass('г') / Mr))
+    return ResultCalculate(answer, round(n))
 
 
 def volume_fraction(volume_part: str, volume_mixture: str) -> ResultCalculate:
-    result = round(Volume(volume_part).get_volume('м³') /
-                   Volume(volume_mixture).get_volume('м³'))
+    result = Volume(volume_part).get_volume('м³', exact=True) / Volume(volume_mixture).get_volume('м³', exact=True)
     answer = f"φ = {volume_part} / {volume_mixture} " \
-             f"= {result} = <b>{result * 100}%</b>"
-    return ResultCalculate(answer, result)
+             f"= {render(result)} = <b>{render(result * 100)}%</b>"
+    return ResultCalculate(answer, round(result))
 
 
-def mass_fraction(string: str, element: str, elements: list[str]) -> ResultCalculate:
-    number_to_index = {"1": "₁", "2": "₂", "3": "₃", "4": "₄", "5": "₅", "6": "₆", "7": "₇", "8": "₈",
-                       "9": "₉"}
-    nti = lambda i: "".join([number_to_index.get(j, j) for j in i])
-    Mr = molecular_weight(string, elements)
-    n = elements.count(element)
-    result = f"1. {Mr.answer}\n2. ω({element}) = Aᵣ({element}) * n({element}) / Mᵣ({nti(string)}) * 100% = " \
-             f"{Ar(element)} * {n} / {Mr.result} * 100% = <b>{round(Ar(element) * n / Mr.result * 100)}%</b>"
-
-    return ResultCalculate(result, round(Ar(element) * n / Mr.result))
-
-
-def molecular_weight(string: str, elements: list[str]) -> ResultCalculate:
-    number_to_index = {"1": "₁", "2": "₂", "3": "₃", "4": "₄", "5": "₅", "6": "₆", "7": "₇", "8": "₈",
-                       "9": "₉"}
-    nti = lambda i: "".join([number_to_index.get(j, j) for j in i])
-    answer = f"Mᵣ({nti(string)}) = "
-    set_elements = []
-    for element in elements:
-        if element not in set_elements:
-            set_elements.append(element)
-    for element in set_elements:
-        if elements.count(element) == 1:
-            answer += f"Aᵣ({element}) + "
-        else:
-            answer += f"{elements.count(element)}Aᵣ({element}) + "
-    answer = list(answer)
-    answer[-2] = "="
-    answer = "".join(answer)
-    weights = []
-    for element in set_elements:
-        weights.append(Ar(element))
-    string = answer.split("= ")[1][:-1]
-    string = re.sub(r'(\d+)A', r'\1 * A', string)
-    Ars = re.findall(r'Aᵣ\(\w+\)', string)
-    for ar in Ars:
-        string = string.replace(ar, str(Ar(ar[3:-1])))
-    answer += string + " = " + f"<b>{eval(string)}</b>"
-    result = eval(string)
+def mass_fraction(string: str, element: str, composition: dict[str, int]) -> ResultCalculate:
+    Mr = molecular_weight(string, composition)
+    n = composition[element]
+    fraction = to_exact(Ar(element)) * n / to_exact(Mr.result)
+    result = f"1. {Mr.answer}\n2. ω({element}) = Aᵣ({element}) * n({element}) / Mᵣ({format_formula(string)}) * 100% = " \
+             f"{Ar(element)} * {n} / {Mr.result} * 100% = <b>{render(fraction * 100)}%</b>"
+
+    return ResultCalculate(result, round(fraction))
+
+
+def molecular_weight(string: str, composition: dict[str, int]) -> ResultCalculate:
+    result = molar_mass(composition)
+    symbols = " + ".join(f"Aᵣ({element})" if count == 1 else f"{count}Aᵣ({element})"
+                         for element, count in composition.items())
+    numbers = " + ".join(f"{Ar(element)}" if count == 1 else f"{count} * {Ar(element)}"
+                         for element, count in composition.items())
+    answer = f"Mᵣ({format_formula(string)}) = {symbols} = {numbers} = <b>{result}</b>"
     return ResultCalculate(answer, result)
 
 
 def Ar(element: str) -> int:
-    relative_molecular_weights = \
-        {"H": 1, "He": 4, "Li": 7, "Be": 9, "B": 11, "C": 12, "N": 14, "O": 16, "F": 19, "Ne": 20,
-         "Na": 23, "Mg": 24, "Al": 27, "Si": 28, "P": 31, "S": 32, "Cl": 35.5, "Ar": 40,
-         "K": 39, "Ca": 40, "Sc": 45, "Ti": 48, "V": 51, "Cr": 52, "Mn": 55, "Fe": 56, "Co": 59, "Ni": 59,
-         "Cu": 64, "Zn": 65, "Ga": 70, "Ge": 73, "As": 75, "Se": 79, "Br": 80, "Kr": 84,
-         "Rb": 85, "Sr": 88, "Y": 89, "Zr": 91, "Nb": 93, "Mo": 96, "Tc": 98, "Ru": 101, "Rh": 103, "Pd": 106,
-         "Ag": 108, "Cd": 112, "In": 115, "Sn": 119, "Sb": 122, "Te": 128, "I": 127, "Xe": 131,
-         "Cs": 133, "Ba": 137, "Hf": 178, "Ta": 181, "W": 184, "Re": 186, "Os": 190, "Ir": 192, "Pt": 195,
-         "Au": 197, "Hg": 201, "Tl": 204, "Pb": 207, "Bi": 209, "Po": 209, "At": 210, "Rn": 222,
-         "Fr": 223, "Ra": 226, "Rf": 261, "Db": 262, "Sg": 266, "Bh": 267, "Hs": 269, "Mt": 268, "Ds": 271,
-         "Rg": 282, "Cn": 285, "Nh": 286, "Fl": 289, "Mc": 288, "Lv": 293, "Ts": 294, "Og": 294,
-
-         # Лантаноиды
-         "La": 139, "Ce": 141, "Pr": 141, "Nd": 144, "Pm": 145, "Sm": 150, "Eu": 152, "Gd": 157, "Tb": 159, "Dy": 163,
-         "Ho": 165, "Er": 167, "Tm": 169, "Yb": 173, "Lu": 175,
-
-         # Актиноиды
-         "Ac": 227, "Th": 232, "Pa": 231, "U": 238, "Np": 237, "Pu": 244, "Am": 243, "Cm": 247, "Bk": 247, "Cf": 251,
-         "Es": 252, "Fm": 257, "Md": 258, "No": 259, "Lr": 260}
-    return relative_molecular_weights[element]
-
-
-def get_elements(string: str, _set: bool = False) -> list[str]:
-    numbers = {"₂": "2", "₃": "3", "₄": "4", "₇": "7"}
-    elements = []
-    i = 0
-    if string.count("(") or string.count(")"):
-        if string.count("(") - 1 or string.count(")") - 1:
-            raise ValueError()
-        inside_string = string[string.index("(") + 1:string.index(")")]
-        coefficient = int(string[string.index(")") + 1])
-        inside_elements = get_elements(inside_string) * coefficient
-        string = string.replace(f"({inside_string}){coefficient}", "")
-        elements = get_elements(string) + inside_elements
-
-        if not _set:
-            return elements
-        set_elements = []
-        for element in elements:
-            if element not in set_elements:
-                set_elements.append(element)
-        return set_elements
-
-    while i < len(string):
-        element = ""
-        change_i = False
-        for n in range(i + 1, len(string)):
-            if string[n].isupper():
-                element = string[i:n]
-                i = n
-                change_i = True
-                break
-        if not change_i:
-            element = string[i:len(string)]
-            i = len(string)
-
-        coefficient = 1
-        for n in str(element):
-            if n.isnumeric():
-                element, coefficient = element[0:element.index(n)], int(numbers.get(element[element.index(n):],
-                                                                                    element[element.index(n):]))
-                break
-        elements += [element] * coefficient
-
-    for element in elements:
-        Ar(element)
-
-    if not _set:
-        return elements
-    set_elements = []
-    for element in elements:
-        if element not in set_elements:
-            set_elements.append(element)
-    return set_elements
+    return by_symbol[element].weight
 
 
 Inf = EducationalInformation
@@ -1465,7 +1416,8 @@ functions = {
             text="Mr (относительная молекулярная масса)",
             data_path=DataPath('calculate_chemistry', 'molecular_weight'),
             state=UserState.molecular_weight,
-            function=answer_text("Напишите формулу вещества. Например, `H2O`")
+            function=answer_text("Напишите формулу вещества. Например, `H2O`. Несколько формул "
+                                 "можно отправить по одной в строке или файлом .txt/.csv")
         ),
         mass_fraction=EducationalFunction(
             text="ω (массовая доля элемента в веществе)",
@@ -1492,8 +1444,8 @@ functions = {
             text="n (количество вещества через число частиц)",
             data_path=DataPath('calculate_chemistry', 'amount_of_substance_from_number_of_particles'),
             state=UserState.amount_of_substance_from_number_of_particles,
-            function=answer_text("Отправьте число частиц вещества. Для знака степени используйте `**`. "
-                                 "Например: `6.02 * 10**23`")
+            function=answer_text("Отправьте число частиц вещества. Для знака степени используйте `^`. "
+                                 "Например: `6.02 * 10^23` или `3e20`")
         ),
         amount_of_substance_from_volume_of_gas=EducationalFunction(
             text="n (количество вещества через объем газа)",
@@ -1532,7 +1484,26 @@ functions = {
             data_path=DataPath('task_chemistry', 'setting_coefficients'),
             state=UserState.setting_coefficients,
             function=answer_text("Отправьте уравнение реакции, в которой необходимо расставить "
-                                 "коэффициенты. Например: `C + O2 = CO2`")
+                                 "коэффициенты. Например: `C + O2 = CO2`. Несколько уравнений можно "
+                                 "отправить по одному в строке или файлом .txt/.csv")
         )
     )
 }
+
+
+# Плоский индекс всех разделов: callback_data ("physics7.force.gravity") -> раздел. Клавиатуры
+# разделов строятся один раз здесь, а не при каждом нажатии кнопки
+def compile_index(datas, path: tuple = ()) -> dict[str, Union[EducationalData, EducationalInformation,
+                                                           EducationalFunction]]:
+    result = {}
+    for key, data in datas.items():
+        data_path = path + (key,)
+        result[".".join(data_path)] = data
+        if isinstance(data, EducationalData):
+            result.update(compile_index(data, data_path))
+        if isinstance(data, (EducationalData, EducationalInformation)):
+            data.markup  # Клавиатура строится заранее и затем переиспользуется
+    return result
+
+
+index = compile_index(functions)
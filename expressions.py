@@ -0,0 +1,92 @@
+import re
+import ast
+import time
+import operator
+from functools import lru_cache
+from typing import Union, Callable
+from workers import TooComplex
+
+Number = Union[int, float]
+
+max_length = 200
+max_nodes = 64
+max_exponent = 1000
+max_bits = 4096  # Размер целых результатов: 10^1000 * 10^1000 * ... не должно расти без предела
+time_limit = 0.05  # Секунд на вычисление
+
+replacements = str.maketrans({"^": "**", "×": "*", "·": "*", "÷": "/", ":": "/", "−": "-", ",": "."})
+superscript_to_numbers = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻", "0123456789+-")
+superscript_pattern = re.compile(r"[⁺⁻]?[⁰¹²³⁴⁵⁶⁷⁸⁹]+")
+
+
+def power(base: Number, exponent: Number) -> Number:
+    if abs(exponent) > max_exponent:
+        raise TooComplex("Exponent is too large")
+    # Размер целой степени проверяется до вычисления: (9**999)**999 считалось бы сотни миллисекунд
+    if isinstance(base, int) and isinstance(exponent, int) and abs(base).bit_length() * exponent > max_bits:
+        raise TooComplex("Result is too large")
+    return base ** exponent
+
+
+binary_operators = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: power,
+}
+unary_operators = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+# Узел дерева превращается в функцию от крайнего срока вычисления; допускаются только числа, скобки,
+# + - * / ** и унарные знаки
+def compile_node(node: ast.AST) -> Callable[[float], Number]:
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = node.value
+        return lambda deadline: value
+    if isinstance(node, ast.UnaryOp) and type(node.op) in unary_operators:
+        function, operand = unary_operators[type(node.op)], compile_node(node.operand)
+        return lambda deadline: function(operand(deadline))
+    if isinstance(node, ast.BinOp) and type(node.op) in binary_operators:
+        function, left, right = binary_operators[type(node.op)], compile_node(node.left), compile_node(node.right)
+
+        def binary(deadline: float) -> Number:
+            a, b = left(deadline), right(deadline)
+            if time.perf_counter() > deadline:
+                raise TooComplex("Calculation time limit exceeded")
+            try:
+                result = function(a, b)
+            except OverflowError:  # 10.0**1000, слишком большое целое при переводе в float
+                raise TooComplex("Result is too large") from None
+            if isinstance(result, complex):
+                raise ValueError("Result is not a real number")
+            if isinstance(result, int) and result.bit_length() > max_bits:
+                raise TooComplex("Result is too large")
+            return result
+
+        return binary
+    raise ValueError(f"Unsupported expression: {type(node).__name__}")
+
+
+# Скомпилированные выражения кэшируются: одни и те же числа (6.02 * 10^23) присылают постоянно
+@lru_cache(maxsize=256)
+def compile_expression(string: str) -> Callable[[float], Number]:
+    if len(string) > max_length:
+        raise TooComplex("Expression is too long")
+    string = superscript_pattern.sub(lambda power: f"**({power[0].translate(superscript_to_numbers)})",
+                                     string.translate(replacements))
+    try:
+        tree = ast.parse(string.strip(), mode="eval")
+    except SyntaxError:
+        raise ValueError("Incorrect expression") from None
+    if sum(1 for _ in ast.walk(tree)) > max_nodes:
+        raise TooComplex("Expression is too complex")
+    return compile_node(tree.body)
+
+
+# Вычисление арифметического выражения из сообщения вместо eval: 6.02*10^23, 3e20, 10²³, 2 × 10**5
+def evaluate(string: str) -> Number:
+    return compile_expression(string)(time.perf_counter() + time_limit)
@@ -1,28 +1,52 @@
 import sys
+import time
 import asyncio
 import aiohttp
+import materials
+import traceback
+from html import escape
 from typing import Literal
+from notifications import OwnerNotifier
+from batch import pages
+from migrations import migrate
 from sys_keys import TOKEN, api_key, process_id
-from educational_data import functions, DataPath, calculate_chemistry, UserState, task_chemistry
+from educational_data import (
+    index,
+    functions,
+    compounds,
+    UserState,
+    equations,
+    balance_pool,
+    task_chemistry,
+    buildable_names,
+    calculate_chemistry,
+)
 from core import (
     db,
     html,
+    photos,
     SITE,
     OWNER,
     channel,
     security,
     markdown,
+    TTLCache,
+    time_now,
     subscribe,
     omsk_time,
     get_users,
+    audit_log,
     set_version,
     get_version,
-    resources_path
+    resources_path,
+    get_acquaintances,
+    prewarm_photos,
+    last_message_interval
 )
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.fsm.context import FSMContext
-from aiogram.filters.command import Command, CommandStart
+from aiogram.filters.command import Command, CommandStart, CommandObject
 from aiogram.types import InlineKeyboardMarkup as IMarkup
 from aiogram.types import InlineKeyboardButton as IButton
 from aiogram.types import (
@@ -35,10 +59,21 @@ from aiogram.types import (
 bot = Bot(TOKEN)
 dp = Dispatcher()
 
+subscriptions = TTLCache(positive_ttl=15 * 60, negative_ttl=30)
+notifier = OwnerNotifier(bot, OWNER, parse_mode=html)
+upsert_user = "INSERT INTO users (id, last_message) VALUES(?, ?) " \
+              "ON CONFLICT(id) DO UPDATE SET last_message=excluded.last_message"
+
 
 # Класс с глобальными переменными для удобного пользования
 class Data:
     users = set()
+    acquaintances = {}
+    last_message_saved = {}  # id -> time.monotonic() последней записи last_message
+    last_message_pending = {}  # id -> last_message, еще не записанный из-за last_message_interval
+    prewarm = None
+    flush_last_messages = None
+    stopping = None  # Остановка выполняется один раз, даже если ее одновременно вызвали /stop и start_bot
 
 
 # Метод для добавления и изменения "знакомых"
@@ -50,13 +85,18 @@ async def _new_acquaintance(message: Message):
         id = int(message.reply_to_message.caption.split('\n', 1)[0].replace("ID: ", ""))
         name = message.text.split(maxsplit=1)[1]
     else:
-        id, name = message.text.split(maxsplit=2)[1:]
-    if await db.execute("SELECT id FROM acquaintances WHERE id=?", (id,)):
-        await db.execute("UPDATE acquaintances SET name=? WHERE id=?", (name, id))
+        command = message.text.split(maxsplit=2)
+        if len(command) != 3 or not command[1].isdigit():
+            return await message.answer("Неверный формат команды: /new_acquaintance ID имя")
+        id, name = command[1:]
+    id = int(id)
+    await db.execute("INSERT INTO acquaintances (id, name) VALUES(?, ?) "
+                     "ON CONFLICT(id) DO UPDATE SET name=excluded.name", (id, name))
+    if id in Data.acquaintances:
         await message.answer("Данные знакомого изменены")
     else:
-        await db.execute("INSERT INTO acquaintances VALUES(?, ?)", (id, name))
         await message.answer("Добавлен новый знакомый!")
+    Data.acquaintances[id] = name
 
 
 # Метод для отправки сообщения от имени бота
@@ -82,6 +122,7 @@ async def _admin(message: Message):
                          "/stop - остановить бота\n"
                          "/db - база данных бота\n"
                          "/version - изменить версию бота\n"
+                         "/stats - статистика вычислений\n"
                          "/new_acquaintance - добавить знакомого")
 
 
@@ -93,6 +134,7 @@ async def _reload(message: Message):
         await message.answer("*Перезапуск бота*", parse_mode=markdown)
         print("Перезапуск бота")
         await dp.stop_polling()
+        await stop_bot()
         asyncio.get_event_loop().stop()  # netangels после остановки фонового процесса автоматически запустит его
     else:
         await message.answer("В тестовом режиме перезапуск бота программно не предусмотрен!")
@@ -105,6 +147,8 @@ async def _stop(message: Message):
     if await developer_command(message): return
     await message.answer("*Остановка бота*", parse_mode=markdown)
     print("Остановка бота")
+    await dp.stop_polling()
+    await stop_bot()
     if sys.argv[1] == "release":
         async with aiohttp.ClientSession() as session:
             async with session.post("https://panel.netangels.ru/api/gateway/token/",
@@ -113,7 +157,6 @@ async def _stop(message: Message):
                 await session.post(f"https://api-ms.netangels.ru/api/v1/hosting/background-processes/{process_id}/stop",
                                    headers={"Authorization": f"Bearer {token}"})
     else:
-        await dp.stop_polling()
         asyncio.get_event_loop().stop()
 
 
@@ -121,9 +164,26 @@ async def _stop(message: Message):
 @security()
 async def _db(message: Message):
     if await developer_command(message): return
+    await db.execute("PRAGMA wal_checkpoint(FULL)")  # Перенос изменений из WAL-журнала в основной файл
     await message.answer_document(FSInputFile(resources_path(db.db_path)))
 
 
+@dp.message(Command('stats'))
+@security()
+async def _stats(message: Message):
+    if await developer_command(message): return
+    pool = balance_pool.stats()
+    cache = equations.stats()
+    await message.answer("Уравнивание реакций (пул процессов):\n"
+                         f"Процессов: {pool['size']}, занято: {pool['busy']}\n"
+                         f"В очереди: {pool['queued']} (максимум {pool['max_queued']})\n"
+                         f"Выполнено: {pool['completed']}, превышений времени: {pool['timeouts']}, "
+                         f"перезапусков: {pool['restarts']}\n\n"
+                         "Кэш уравнений:\n"
+                         f"Записей в памяти: {cache['size']} из {cache['max_size']}\n"
+                         f"Попаданий: {cache['hits']}, из базы данных: {cache['db_hits']}, промахов: {cache['misses']}")
+
+
 @dp.message(Command('feedback'))
 @security('state')
 async def _start_feedback(message: Message, state: FSMContext):
@@ -139,18 +199,12 @@ async def _start_feedback(message: Message, state: FSMContext):
 async def _feedback(message: Message, state: FSMContext):
     if await new_message(message, forward=False): return
     await state.clear()
-    acquaintance = await username_acquaintance(message)
-    acquaintance = f"<b>Знакомый: {acquaintance}</b>\n" if acquaintance else ""
-    await bot.send_photo(OWNER,
-                         photo=FSInputFile(resources_path("feedback.png")),
-                         caption=f"ID: {message.chat.id}\n"
-                                 f"{acquaintance}" +
-                                 (f"USERNAME: @{message.from_user.username}\n" if message.from_user.username else "") +
-                                 f"Имя: {message.from_user.first_name}\n" +
-                                 (f"Фамилия: {message.from_user.last_name}\n" if message.from_user.last_name else "") +
-                                 f"Время: {omsk_time(message.date)}",
-                         parse_mode=html)
-    await message.forward(OWNER)
+    caption = user_header(message.chat.id, message.from_user.username, message.from_user.first_name,
+                          message.from_user.last_name, username_acquaintance(message)) + \
+        f"Время: {omsk_time(message.date)}"
+    notifier.send_now(lambda: photos.send(lambda photo: bot.send_photo(OWNER, photo, caption=caption, parse_mode=html),
+                                          "feedback.png"))
+    notifier.forward(message)
     await message.answer("Большое спасибо за отзыв!❤️❤️❤️")
 
 
@@ -180,13 +234,15 @@ async def _version(message: Message):
 @security()
 async def _check_subscribe(callback_query: CallbackQuery):
     if await new_callback_query(callback_query, check_subscribe=False): return
-    if (await bot.get_chat_member(channel, callback_query.message.chat.id)).status == 'left':
+    subscriptions.invalidate(callback_query.message.chat.id)
+    if not await is_subscribed(callback_query.message.chat.id):
         await callback_query.answer("Вы не подписались на наш канал😢", True)
-        await callback_query.bot.send_message(OWNER, "Пользователь не подписался на канал")
+        notifier.add(f"ID: {callback_query.message.chat.id}\n", "Пользователь не подписался на канал")
     else:
         await callback_query.message.delete()
         await callback_query.answer("Спасибо за подписку!❤️ Продолжайте пользоваться ботом", True)
-        await callback_query.bot.send_message(OWNER, "Пользователь подписался на канал. Ему предоставлен полный доступ")
+        notifier.add(f"ID: {callback_query.message.chat.id}\n",
+                     "Пользователь подписался на канал. Ему предоставлен полный доступ")
 
 
 @dp.message(CommandStart())
@@ -195,7 +251,7 @@ async def _start(message: Message, state: FSMContext):
     await state.clear()
     await (await message.answer("...Удаление клавиатурных кнопок...", reply_markup=ReplyKeyboardRemove())).delete()
     markup = IMarkup(inline_keyboard=[[IButton(text="Мои функции", callback_data="help")]])
-    await message.answer(f"Привет, {await username_acquaintance(message, 'first_name')}\n"
+    await message.answer(f"Привет, {username_acquaintance(message, 'first_name')}\n"
                          f"[tgmaksim.ru]({SITE})",
                          parse_mode=markdown, reply_markup=markup)
     if message.text == "/start calculate_chemistry":
@@ -243,79 +299,44 @@ async def help(message: Message):
                          "/heat_capacity - таблица удельной теплоемкости\n"
                          "/melting - таблица удельной теплоты плавления и кристаллизации\n"
                          "/vaporization - таблица удельной теплоты парообразования и конденсации\n"
+                         "Значение для одного вещества: /density железо\n"
                          f"<a href='{SITE}'>tgmaksim.ru</a>", parse_mode=html)
 
 
-@dp.message(Command('density'))
-@security()
-async def _density(message: Message):
+# Команды, отправляющие таблицы-изображения. Несколько изображений отправляются одним альбомом
+tables = {
+    'density': ("Density/density.png",),
+    'fuel': ("Thermal Phenomena/fuel.png",),
+    'heat_capacity': ("Thermal Phenomena/heat_capacity.png",),
+    'melting': ("Thermal Phenomena/melting.png",),
+    'vaporization': ("Thermal Phenomena/vaporization.png",),
+    'mendeleev_table': ("Chemistry/main_chemistry_table.png",),
+    'valence_table': ("Chemistry/valence_table (1).png", "Chemistry/valence_table (2).png"),
+    'names_compounds': ("Chemistry/names_compounds (1).png", "Chemistry/names_compounds (2).png"),
+    'names_acids': ("Chemistry/names_acids.png",),
+    'prefixes': ("Prefixes/prefixes.png",),
+}
+for table in tables.values():
+    for path in table:
+        photos.register(path)
+photos.register("feedback.png")
+
+
+@dp.message(Command(*tables))
+@security('command')
+async def _tables(message: Message, command: CommandObject):
     if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Density/density.png")))
-
-
-@dp.message(Command('fuel'))
-@security()
-async def _fuel(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Thermal Phenomena/fuel.png")))
-
-
-@dp.message(Command('heat_capacity'))
-@security()
-async def _heat_capacity(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Thermal Phenomena/heat_capacity.png")))
-
-
-@dp.message(Command('melting'))
-@security()
-async def _melting(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Thermal Phenomena/melting.png")))
-
-
-@dp.message(Command('vaporization'))
-@security()
-async def _vaporization(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Thermal Phenomena/vaporization.png")))
-
-
-@dp.message(Command('mendeleev_table'))
-@security()
-async def _mendeleev_table(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Chemistry/main_chemistry_table.png")))
-
-
-@dp.message(Command('valence_table'))
-@security()
-async def _valence_table(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Chemistry/valence_table (1).png")))
-    await message.answer_photo(FSInputFile(resources_path("Chemistry/valence_table (2).png")))
-
-
-@dp.message(Command('names_compounds'))
-@security()
-async def _names_compounds(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Chemistry/names_compounds (1).png")))
-    await message.answer_photo(FSInputFile(resources_path("Chemistry/names_compounds (2).png")))
-
-
-@dp.message(Command('names_acids'))
-@security()
-async def _names_acids(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path('Chemistry/names_acids.png')))
-
-
-@dp.message(Command('prefixes'))
-@security()
-async def _prefixes(message: Message):
-    if await new_message(message): return
-    await message.answer_photo(FSInputFile(resources_path("Prefixes/prefixes.png")))
+    caption = None
+    if command.args and command.command in materials.tables:  # /density железо - одно значение текстом
+        answer = materials.lookup(command.command, command.args)
+        if answer is not None:
+            return await message.answer(answer)
+        caption = f"Вещество «{command.args}» не найдено, вот вся таблица"
+    paths = tables[command.command]
+    if len(paths) == 1:
+        await photos.answer_photo(message, paths[0], caption=caption)
+    else:
+        await photos.answer_media_group(message, paths)
 
 
 @dp.message(Command('physics7', 'physics8', 'chemistry8', 'calculate_chemistry', 'task_chemistry'))
@@ -349,6 +370,19 @@ def decor_new_callback_query(fun):
     return new
 
 
+@dp.callback_query(F.data.startswith("batch_page:"))
+@security()
+async def _batch_page(callback_query: CallbackQuery):
+    if await new_callback_query(callback_query): return
+    _, key, number = callback_query.data.split(":")
+    text = pages.get(key, int(number))
+    if text is None:
+        return await callback_query.answer("Результаты больше недоступны, отправьте данные еще раз")
+    if callback_query.message.html_text != text:
+        await callback_query.message.edit_text(text, parse_mode=html, reply_markup=pages.markup(key, int(number)))
+    await callback_query.answer()
+
+
 dp.message(UserState.molecular_weight)(decor_new_message(calculate_chemistry.molecular_weight))
 dp.message(UserState.mass_fraction1)(decor_new_message(calculate_chemistry.mass_fraction1))
 dp.callback_query(UserState.mass_fraction2)(decor_new_callback_query(calculate_chemistry.mass_fraction2))
@@ -366,6 +400,8 @@ dp.message(UserState.gas_density)(decor_new_message(calculate_chemistry.gas_dens
 dp.message(UserState.formulation_of_chemical_formulas)(
     decor_new_message(task_chemistry.formulation_of_chemical_formulas))
 dp.message(UserState.making_formulas_by_name)(decor_new_message(task_chemistry.making_formulas_by_name))
+dp.callback_query(UserState.making_formulas_by_name, F.data.startswith("name:"))(
+    security('state')(decor_new_callback_query(task_chemistry.making_formulas_by_name_suggestion)))
 dp.message(UserState.setting_coefficients)(decor_new_message(task_chemistry.setting_coefficients))
 
 
@@ -373,8 +409,9 @@ dp.message(UserState.setting_coefficients)(decor_new_message(task_chemistry.sett
 @security('state')
 async def _educational_functions(callback_query: CallbackQuery, state: FSMContext):
     if await new_callback_query(callback_query): return
-    await callback_query.message.edit_text(DataPath(*callback_query.data.split(".")).data.text)
-    await DataPath(*callback_query.data.split(".")).data(callback_query.message, state)
+    data = index[callback_query.data]
+    await callback_query.message.edit_text(data.text)
+    await data(callback_query.message, state)
 
 
 @dp.callback_query()
@@ -387,7 +424,7 @@ async def _educational_data(callback_query: CallbackQuery):
         await callback_query.message.delete()
         new = True
         callback_query_data = callback_query_data.replace("_del", "", 1)
-    await DataPath(*callback_query_data.split(".")).data(callback_query.message, new)
+    await index[callback_query_data](callback_query.message, new)
 
 
 @dp.callback_query()
@@ -403,17 +440,43 @@ async def _other_messages(message: Message):
 
 
 async def new_user(message: Message):
-    if not await db.execute("SELECT id FROM users WHERE id=?", (str(message.chat.id),)):
-        await db.execute("INSERT INTO users VALUES(?, ?)", (message.chat.id, ""))
-        Data.users.add(message.chat.id)
-    await db.execute("UPDATE users SET last_message=? WHERE id=?", (str(omsk_time(message.date)), message.chat.id))
-
-
-async def username_acquaintance(message: Message, default: Literal[None, 'first_name'] = None):
     id = message.chat.id
-    user = await db.execute("SELECT name FROM acquaintances WHERE id=?", (id,))
-    if user:
-        return user[0][0]
+    last_message = str(omsk_time(message.date))
+    saved = Data.last_message_saved.get(id)
+    now = time.monotonic()
+    if id in Data.users and saved is not None and now - saved < last_message_interval:
+        Data.last_message_pending[id] = last_message
+        return
+    Data.users.add(id)
+    Data.last_message_saved[id] = now
+    Data.last_message_pending.pop(id, None)
+    await db.execute(upsert_user, (id, last_message))
+
+
+async def save_last_messages():
+    pending, Data.last_message_pending = Data.last_message_pending, {}
+    if pending:
+        await db.execute_batch({upsert_user: list(pending.items())})
+
+
+# Отложенные last_message записываются раз в last_message_interval (а не только при остановке), отметки о
+# записи старше интервала больше ничего не откладывают и удаляются
+async def flush_last_messages():
+    while True:
+        await asyncio.sleep(last_message_interval)
+        now = time.monotonic()
+        Data.last_message_saved = {id: saved for id, saved in Data.last_message_saved.items()
+                                   if now - saved < last_message_interval}
+        try:
+            await asyncio.shield(save_last_messages())  # Отмена при остановке не прерывает начатую запись
+        except Exception:
+            traceback.print_exc()
+
+
+def username_acquaintance(message: Message, default: Literal[None, 'first_name'] = None):
+    name = Data.acquaintances.get(message.chat.id)
+    if name:
+        return name
     return message.from_user.first_name if default == 'first_name' else None
 
 
@@ -428,18 +491,33 @@ async def developer_command(message: Message) -> bool:
     return message.chat.id != OWNER
 
 
+async def is_subscribed(id: int) -> bool:
+    async def load():
+        return (await bot.get_chat_member(channel, id)).status != 'left'
+
+    return await subscriptions.get(id, load)
+
+
 async def subscribe_to_channel(id: int, text: str = ""):
-    if (await bot.get_chat_member(channel, id)).status == 'left' and not text.startswith('/start'):
+    if not (text or "").startswith('/start') and not await is_subscribed(id):
         markup = IMarkup(
             inline_keyboard=[[IButton(text="Подписаться на канал", url=subscribe)],
                              [IButton(text="Подписался", callback_data="subscribe")]])
         await bot.send_message(id, "Бот работает только с подписчиками моего канала. "
                                    "Подпишитесь и получите полный доступ к боту", reply_markup=markup)
-        await bot.send_message(OWNER, "Пользователь не подписан на наш канал, доступ ограничен!")
+        notifier.add(f"ID: {id}\n", "Пользователь не подписан на наш канал, доступ ограничен!")
         return False
     return True
 
 
+def user_header(id, username: str, first_name: str, last_name: str, acquaintance: str = None) -> str:
+    return f"ID: {id}\n" + \
+        (f"<b>Знакомый: {escape(acquaintance)}</b>\n" if acquaintance else "") + \
+        (f"USERNAME: @{username}\n" if username else "") + \
+        f"Имя: {escape(first_name)}\n" + \
+        (f"Фамилия: {escape(last_name)}\n" if last_name else "")
+
+
 async def new_message(message: Message, /, forward: bool = True) -> bool:
     if message.content_type == "text":
         content = message.text
@@ -452,66 +530,30 @@ async def new_message(message: Message, /, forward: bool = True) -> bool:
     first_name = message.from_user.first_name
     last_name = message.from_user.last_name
     date = str(omsk_time(message.date))
-    acquaintance = await username_acquaintance(message)
-    acquaintance = f"<b>Знакомый: {acquaintance}</b>\n" if acquaintance else ""
 
-    await db.execute("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)",
-                     (id, username, first_name, last_name, content, date))
+    await audit_log.put("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                        (id, username, first_name, last_name, content, date))
 
     if message.chat.id == OWNER:
         return False
 
-    if message.content_type not in ("text", "web_app_data"):  # Если сообщение не является текстом или ответом mini app
-        await bot.send_message(
-            OWNER,
-            text=f"ID: {id}\n"
-                 f"{acquaintance}" +
-                 (f"USERNAME: @{username}\n" if username else "") +
-                 f"Имя: {first_name}\n" +
-                 (f"Фамилия: {last_name}\n" if last_name else "") +
-                 f"Время: {date}",
-            parse_mode=html)
-        await message.forward(OWNER)
-    elif forward or (message.entities and message.entities[0].type != 'bot_command'):  # Если сообщение содержит форматирование или необходимо переслать сообщение
-        if message.entities and message.entities[0].type != 'bot_command':
-            await bot.send_message(
-                OWNER,
-                text=f"ID: {id}\n"
-                     f"{acquaintance}" +
-                     (f"USERNAME: @{username}\n" if username else "") +
-                     f"Имя: {first_name}\n" +
-                     (f"Фамилия: {last_name}\n" if last_name else "") +
-                     f"Время: {date}",
-                parse_mode=html)
-            await message.forward(OWNER)
-        else:  # Если сообщение не содержит форматирование и его не нужно пересылать
-            try:
-                await bot.send_message(
-                    OWNER,
-                    text=f"ID: {id}\n"
-                         f"{acquaintance}" +
-                         (f"USERNAME: @{username}\n" if username else "") +
-                         f"Имя: {first_name}\n" +
-                         (f"Фамилия: {last_name}\n" if last_name else "") +
-                         (f"<code>{content}</code>\n"
-                          if not content.startswith("/") or len(content.split()) > 1 else f"{content}\n") +
-                         f"Время: {date}",
-                    parse_mode=html)
-            except:
-                await bot.send_message(
-                    OWNER,
-                    text=f"ID: {id}\n"
-                         f"{acquaintance}" +
-                         (f"USERNAME: @{username}\n" if username else "") +
-                         f"Имя: {first_name}\n" +
-                         (f"Фамилия: {last_name}\n" if last_name else "") +
-                         f"<code>{content}</code>\n"
-                         f"Время: {date}",
-                    parse_mode=html)
-                await message.forward(OWNER)
-
-    if message.chat.id not in Data.users:
-        await message.forward(OWNER)
+    header = user_header(id, username, first_name, last_name, username_acquaintance(message))
+    first_contact = message.chat.id not in Data.users
+    if message.content_type not in ("text", "web_app_data") or \
+            (message.entities and message.entities[0].type != 'bot_command'):  # Если сообщение не является текстом или содержит форматирование
+        notifier.send_message(header + f"Время: {date}")
+        notifier.forward(message)
+    elif forward:  # Если сообщение не содержит форматирование и его нужно переслать
+        text = (f"<code>{escape(content)}</code>\n"
+                if not content.startswith("/") or len(content.split()) > 1 else f"{escape(content)}\n") + \
+            f"Время: {date}"
+        if first_contact:
+            notifier.send_message(header + text)
+        else:
+            notifier.add(header, text)
+
+    if first_contact:
+        notifier.forward(message)
     await new_user(message)
 
     return not await subscribe_to_channel(message.chat.id, message.text)
@@ -524,23 +566,14 @@ async def new_callback_query(callback_query: CallbackQuery, /, check_subscribe:
     last_name = callback_query.from_user.last_name
     callback_data = callback_query.data
     date = str(time_now())
-    acquaintance = await username_acquaintance(callback_query.message)
-    acquaintance = f"<b>Знакомый: {acquaintance}</b>\n" if acquaintance else ""
 
-    await db.execute("INSERT INTO callbacks_query VALUES (?, ?, ?, ?, ?, ?)",
-                     (id, username, first_name, last_name, callback_data, date))
+    await audit_log.put("INSERT INTO callbacks_query VALUES (?, ?, ?, ?, ?, ?)",
+                        (id, username, first_name, last_name, callback_data, date))
 
     if callback_query.from_user.id != OWNER:
-        await bot.send_message(
-            OWNER,
-            text=f"ID: {id}\n"
-                 f"{acquaintance}" +
-                 (f"USERNAME: @{username}\n" if username else "") +
-                 f"Имя: {first_name}\n" +
-                 (f"Фамилия: {last_name}\n" if last_name else "") +
-                 f"CALLBACK_DATA: {callback_data}\n"
-                 f"Время: {date}",
-            parse_mode=html)
+        notifier.add(user_header(id, username, first_name, last_name, username_acquaintance(callback_query.message)),
+                     f"CALLBACK_DATA: {escape(callback_data)}\n"
+                     f"Время: {date}")
 
     if check_subscribe and not await subscribe_to_channel(callback_query.from_user.id):
         await callback_query.message.edit_reply_markup()
@@ -549,22 +582,44 @@ async def new_callback_query(callback_query: CallbackQuery, /, check_subscribe:
 
 
 async def start_bot():
-    await db.execute("CREATE TABLE IF NOT EXISTS messages (id TEXT, username TEXT, first_name TEXT, last_name TEXT, "
-                     "message_text TEXT, datetime TEXT)")
-    await db.execute("CREATE TABLE IF NOT EXISTS callbacks_query (id TEXT, username TEXT, first_name TEXT, "
-                     "last_name TEXT, callback_data TEXT, datetime TEXT)")
-    await db.execute("CREATE TABLE IF NOT EXISTS system_data (key TEXT, value TEXT)")
-    await db.execute("CREATE TABLE IF NOT EXISTS acquaintances (id TEXT, username TEXT, first_name TEXT, "
-                     "last_name TEXT, name TEXT)")
-    await db.execute("CREATE TABLE IF NOT EXISTS users (id TEXT, last_message TEXT)")
-    if not await db.execute("SELECT value FROM system_data WHERE key=?", ("version",)):
-        await db.execute("INSERT INTO system_data VALUES(?, ?)", ("version", "0.0"))
+    balance_pool.start()  # До открытия базы данных, пока у процесса нет дополнительных потоков
+    await db.connect()
+    await migrate()
 
     Data.users = await get_users()
+    Data.acquaintances = await get_acquaintances()
+    await photos.load()
+    compounds.build()
+    buildable_names()
+    audit_log.start()
+    notifier.start()
+    Data.flush_last_messages = asyncio.create_task(flush_last_messages())
 
     await bot.send_message(OWNER, f"*Бот запущен!🚀*", parse_mode=markdown)
+    if prewarm_photos:
+        Data.prewarm = asyncio.create_task(photos.prewarm(bot, OWNER))
     print("Запуск бота")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await stop_bot()
+
+
+async def stop_bot():
+    if Data.stopping is None:
+        Data.stopping = asyncio.ensure_future(_stop_bot())
+    await Data.stopping
+
+
+async def _stop_bot():
+    await notifier.stop()
+    if Data.flush_last_messages is not None:
+        Data.flush_last_messages.cancel()
+        await asyncio.gather(Data.flush_last_messages, return_exceptions=True)
+    await save_last_messages()
+    await audit_log.stop()
+    await db.close()
+    await balance_pool.stop()
 
 
 def check_argv():
@@ -0,0 +1,94 @@
+from bisect import bisect_left
+from types import MappingProxyType
+from collections import namedtuple
+from typing import Union
+from physical_quantities import render
+
+Table = namedtuple("Table", ("title", "unit", "values"))
+
+# Таблицы из учебников физики 7 и 8 класса (А. В. Перышкин): вещество и значение в единицах unit
+tables = MappingProxyType({
+    'density': Table("Плотность", "кг/м³", MappingProxyType({
+        # Твердые тела
+        "осмий": 22600, "иридий": 22400, "платина": 21500, "золото": 19300, "свинец": 11300, "серебро": 10500,
+        "медь": 8900, "латунь": 8500, "сталь": 7800, "железо": 7800, "олово": 7300, "цинк": 7100, "чугун": 7000,
+        "корунд": 4000, "алюминий": 2700, "мрамор": 2700, "стекло оконное": 2500, "фарфор": 2300, "бетон": 2300,
+        "соль поваренная": 2200, "кирпич": 1800, "сахар-рафинад": 1600, "оргстекло": 1200, "капрон": 1100,
+        "полиэтилен": 920, "парафин": 900, "лед": 900, "дуб (сухой)": 700, "сосна (сухая)": 400, "пробка": 240,
+        # Жидкости
+        "ртуть": 13600, "серная кислота": 1800, "мед": 1350, "вода морская": 1030, "молоко цельное": 1030,
+        "вода чистая": 1000, "масло подсолнечное": 930, "масло машинное": 900, "керосин": 800, "спирт": 800,
+        "нефть": 800, "ацетон": 790, "эфир": 710, "бензин": 710, "олово жидкое": 6800, "воздух жидкий": 860,
+        # Газы при 0 °C и нормальном давлении
+        "хлор": 3.21, "углекислый газ": 1.98, "кислород": 1.43, "воздух": 1.29, "азот": 1.25, "угарный газ": 1.25,
+        "природный газ": 0.8, "водяной пар (при 100 °C)": 0.59, "гелий": 0.18, "водород": 0.09,
+    })),
+    'fuel': Table("Удельная теплота сгорания", "Дж/кг", MappingProxyType({
+        "порох": 3.8 * 10 ** 6, "дрова сухие": 1.0 * 10 ** 7, "торф": 1.4 * 10 ** 7, "каменный уголь": 2.7 * 10 ** 7,
+        "спирт": 2.7 * 10 ** 7, "антрацит": 3.0 * 10 ** 7, "древесный уголь": 3.4 * 10 ** 7,
+        "дизельное топливо": 4.2 * 10 ** 7, "природный газ": 4.4 * 10 ** 7, "нефть": 4.4 * 10 ** 7,
+        "бензин": 4.6 * 10 ** 7, "керосин": 4.6 * 10 ** 7, "водород": 1.2 * 10 ** 8,
+    })),
+    'heat_capacity': Table("Удельная теплоемкость", "Дж/(кг · °C)", MappingProxyType({
+        "вода": 4200, "дерево (дуб)": 2400, "спирт": 2500, "эфир": 2350, "лед": 2100, "керосин": 2100,
+        "масло подсолнечное": 1700, "воздух": 1000, "алюминий": 920, "кирпич": 880, "бетон": 880, "стекло": 840,
+        "графит": 750, "чугун": 540, "сталь": 500, "железо": 460, "латунь": 400, "медь": 400, "цинк": 400,
+        "серебро": 250, "олово": 230, "ртуть": 140, "свинец": 140, "золото": 130,
+    })),
+    'melting': Table("Удельная теплота плавления", "Дж/кг", MappingProxyType({
+        "алюминий": 3.9 * 10 ** 5, "лед": 3.4 * 10 ** 5, "железо": 2.7 * 10 ** 5, "медь": 2.1 * 10 ** 5,
+        "парафин": 1.5 * 10 ** 5, "спирт": 1.1 * 10 ** 5, "серебро": 0.87 * 10 ** 5, "сталь": 0.84 * 10 ** 5,
+        "золото": 0.67 * 10 ** 5, "водород": 0.59 * 10 ** 5, "олово": 0.59 * 10 ** 5, "свинец": 0.25 * 10 ** 5,
+        "кислород": 0.14 * 10 ** 5, "ртуть": 0.12 * 10 ** 5,
+    })),
+    'vaporization': Table("Удельная теплота парообразования", "Дж/кг", MappingProxyType({
+        "вода": 2.3 * 10 ** 6, "аммиак (жидкий)": 1.4 * 10 ** 6, "спирт": 0.9 * 10 ** 6, "эфир": 0.4 * 10 ** 6,
+        "ртуть": 0.3 * 10 ** 6, "воздух (жидкий)": 0.2 * 10 ** 6,
+    })),
+})
+
+
+brackets = str.maketrans("()", "  ")
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.lower().replace("ё", "е").translate(brackets).split())
+
+
+# Для каждой таблицы - отсортированные ключи (название целиком и с каждого следующего слова: "машинное"
+# находит "масло машинное") для поиска по префиксу двоичным поиском
+_index = {
+    command: sorted((normalize(name)[start:], name)
+                    for name in table.values
+                    for start in [0] + [i + 1 for i, char in enumerate(normalize(name)) if char == " "])
+    for command, table in tables.items()
+}
+
+
+# Названия веществ таблицы, начинающиеся с query (или с query начинается одно из слов названия); при
+# точном совпадении названия - только оно
+def search(command: str, query: str, limit: int = 5) -> list[str]:
+    query = normalize(query)
+    if not query:
+        return []
+    index = _index[command]
+    names = []
+    for i in range(bisect_left(index, (query,)), len(index)):
+        key, name = index[i]
+        if not key.startswith(query):
+            break
+        if normalize(name) == query:
+            return [name]
+        if name not in names:
+            names.append(name)
+    return names[:limit]
+
+
+def lookup(command: str, query: str) -> Union[str, None]:
+    names = search(command, query)
+    if not names:
+        return None
+    table = tables[command]
+    # Первая буква заглавная без capitalize: "водяной пар (при 100 °C)" не должен стать "(при 100 °c)"
+    return "\n".join([f"{table.title}:"] + [f"{name[:1].upper() + name[1:]} - {render(table.values[name], 3, 10 ** 5)} "
+                                            f"{table.unit}" for name in names])
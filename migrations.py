@@ -0,0 +1,69 @@
+import aiosqlite
+from core import db
+
+
+# Каждая миграция переводит базу данных на следующую версию (PRAGMA user_version).
+# Миграции только добавляются в конец списка, уже выпущенные не изменяются
+async def initial_schema(conn: aiosqlite.Connection):
+    await conn.execute("CREATE TABLE IF NOT EXISTS messages (id TEXT, username TEXT, first_name TEXT, last_name TEXT, "
+                       "message_text TEXT, datetime TEXT)")
+    await conn.execute("CREATE TABLE IF NOT EXISTS callbacks_query (id TEXT, username TEXT, first_name TEXT, "
+                       "last_name TEXT, callback_data TEXT, datetime TEXT)")
+    await conn.execute("CREATE TABLE IF NOT EXISTS system_data (key TEXT, value TEXT)")
+    await conn.execute("CREATE TABLE IF NOT EXISTS acquaintances (id TEXT, username TEXT, first_name TEXT, "
+                       "last_name TEXT, name TEXT)")
+    await conn.execute("CREATE TABLE IF NOT EXISTS users (id TEXT, last_message TEXT)")
+    if not await conn.execute_fetchall("SELECT value FROM system_data WHERE key=?", ("version",)):
+        await conn.execute("INSERT INTO system_data VALUES(?, ?)", ("version", "0.0"))
+
+
+async def primary_keys_and_indexes(conn: aiosqlite.Connection):
+    # При дубликатах остается последняя добавленная строка (для users - самое позднее сообщение)
+    await conn.execute("CREATE TABLE users_new (id INTEGER PRIMARY KEY, last_message TEXT)")
+    await conn.execute("INSERT INTO users_new SELECT CAST(id AS INTEGER), MAX(last_message) FROM users "
+                       "GROUP BY CAST(id AS INTEGER)")
+    await conn.execute("DROP TABLE users")
+    await conn.execute("ALTER TABLE users_new RENAME TO users")
+
+    await conn.execute("CREATE TABLE acquaintances_new (id INTEGER PRIMARY KEY, username TEXT, first_name TEXT, "
+                       "last_name TEXT, name TEXT)")
+    await conn.execute("INSERT INTO acquaintances_new SELECT CAST(id AS INTEGER), username, first_name, last_name, "
+                       "name FROM acquaintances WHERE rowid IN "
+                       "(SELECT MAX(rowid) FROM acquaintances GROUP BY CAST(id AS INTEGER))")
+    await conn.execute("DROP TABLE acquaintances")
+    await conn.execute("ALTER TABLE acquaintances_new RENAME TO acquaintances")
+
+    await conn.execute("CREATE TABLE system_data_new (key TEXT PRIMARY KEY, value TEXT)")
+    await conn.execute("INSERT INTO system_data_new SELECT key, value FROM system_data WHERE rowid IN "
+                       "(SELECT MAX(rowid) FROM system_data GROUP BY key)")
+    await conn.execute("DROP TABLE system_data")
+    await conn.execute("ALTER TABLE system_data_new RENAME TO system_data")
+
+    await conn.execute("CREATE INDEX IF NOT EXISTS messages_id_datetime ON messages (id, datetime)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS callbacks_query_id_datetime ON callbacks_query (id, datetime)")
+
+
+async def file_ids(conn: aiosqlite.Connection):
+    await conn.execute("CREATE TABLE file_ids (path TEXT PRIMARY KEY, mtime REAL, file_id TEXT)")
+
+
+async def equations(conn: aiosqlite.Connection):
+    await conn.execute("CREATE TABLE equations (key TEXT PRIMARY KEY, value TEXT)")
+
+
+migrations = [
+    initial_schema,
+    primary_keys_and_indexes,
+    file_ids,
+    equations,
+]
+
+
+async def migrate():
+    version = (await db.execute("PRAGMA user_version"))[0][0]
+    for number, migration in enumerate(migrations[version:], version + 1):
+        async with db.transaction() as conn:
+            await conn.execute("BEGIN")
+            await migration(conn)
+            await conn.execute(f"PRAGMA user_version={number}")
+        print(f"База данных обновлена до версии {number}")
@@ -0,0 +1,155 @@
+import asyncio
+import traceback
+from collections import deque
+from typing import Union, Callable, Awaitable
+from aiogram import Bot
+from aiogram.types import Message
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest
+
+message_limit = 4096
+
+
+# Ограничение частоты запросов: не чаще одного запроса за interval секунд
+class RateLimiter:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = loop.time() + self.interval
+
+    def pause(self, seconds: float) -> None:
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+
+global_limiter = RateLimiter(1 / 25)  # Telegram допускает около 30 сообщений в секунду на бота
+
+
+# Уведомления владельцу: обычные события собираются в сводку раз в interval секунд (одно сообщение на
+# пользователя, чтобы ответ на сводку по-прежнему уходил этому пользователю), вложения и первые обращения
+# отправляются сразу, но с соблюдением лимитов Telegram
+class OwnerNotifier:
+    def __init__(self, bot: Bot, chat_id: int, interval: float = 5, chat_interval: float = 1,
+                 max_entries: int = 500, parse_mode: str = "HTML"):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.interval = interval
+        self.max_entries = max_entries
+        self.parse_mode = parse_mode
+        self._limiter = RateLimiter(chat_interval)
+        self._entries: dict[str, list[str]] = {}
+        self._count = 0
+        self._dropped = 0
+        self._urgent: deque[Callable[[], Awaitable]] = deque()
+        self._wakeup: Union[asyncio.Event, None] = None
+        self._task: Union[asyncio.Task, None] = None
+        self._stopping = False
+
+    def add(self, header: str, text: str) -> None:
+        if self._count >= self.max_entries:
+            self._dropped += 1
+        else:
+            self._entries.setdefault(header, []).append(text)
+            self._count += 1
+
+    def send_now(self, send: Callable[[], Awaitable]) -> None:
+        self._urgent.append(send)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def send_message(self, text: str) -> None:
+        self.send_now(lambda: self.bot.send_message(self.chat_id, text, parse_mode=self.parse_mode))
+
+    def forward(self, message: Message) -> None:
+        self.send_now(lambda: message.forward(self.chat_id))
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        self._stopping = True
+        self._wakeup.set()
+        await task
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_digest = loop.time() + self.interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, next_digest - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._urgent:
+                if not await self._send(self._urgent.popleft()):
+                    print("Уведомление владельцу не отправлено: Telegram ограничил частоту запросов")
+            if self._stopping or loop.time() >= next_digest:
+                await self._send_digest()
+                next_digest = loop.time() + self.interval
+            if self._stopping and not self._urgent:
+                break
+
+    async def _send_digest(self) -> None:
+        entries, self._entries, self._count = self._entries, {}, 0
+        if self._dropped:
+            entries.setdefault("", []).append(f"...и еще {self._dropped} событий")
+            self._dropped = 0
+        for header, texts in entries.items():
+            for text in split_digest(header, texts):
+                if await self._send(lambda text=text: self._send_text(text)):
+                    continue
+                if self._stopping:
+                    print(f"Сводка для владельца не отправлена: Telegram ограничил частоту запросов\n{text}")
+                else:  # Часть сводки уйдет со следующей
+                    self._entries.setdefault("", []).append(text)
+                    self._count += 1
+
+    async def _send_text(self, text: str):
+        try:
+            return await self.bot.send_message(self.chat_id, text, parse_mode=self.parse_mode)
+        except TelegramBadRequest:  # Ошибка разметки не должна терять всю сводку
+            return await self.bot.send_message(self.chat_id, text)
+
+    # False - Telegram все попытки отвечал RetryAfter, и отправку стоит повторить позже
+    async def _send(self, send: Callable[[], Awaitable], attempts: int = 3) -> bool:
+        for _ in range(attempts):
+            await self._limiter.wait()
+            await global_limiter.wait()
+            try:
+                await send()
+                return True
+            except TelegramRetryAfter as e:
+                self._limiter.pause(e.retry_after)
+                global_limiter.pause(e.retry_after)
+            except Exception:
+                traceback.print_exc()
+                return True
+        return False
+
+
+def split_digest(header: str, texts: list[str], separator: str = "\n") -> list[str]:
+    limit = message_limit - len(header)
+    messages = []
+    current = ""
+    for text in texts:
+        text = text[:limit]
+        if current and len(current) + len(separator) + len(text) > limit:
+            messages.append(header + current)
+            current = ""
+        current = f"{current}{separator}{text}" if current else text
+    if current:
+        messages.append(header + current)
+    return messages
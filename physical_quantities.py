@@ -1,159 +1,155 @@
-class Weight:
-    __degree = 1
-    __main_units = "г"
-    __units = {
-        __main_units: (10 ** 0) ** __degree,
-        f"да{__main_units}": (10 ** 1) ** __degree,
-        f"г{__main_units}": (10 ** 2) ** __degree,
-        f"к{__main_units}": (10 ** 3) ** __degree,
-        f"М{__main_units}": (10 ** 6) ** __degree,
-        f"т": (10 ** 6) ** __degree,
-        f"Г{__main_units}": (10 ** 9) ** __degree,
-        f"Т{__main_units}": (10 ** 12) ** __degree,
-        f"П{__main_units}": (10 ** 15) ** __degree,
-        f"Э{__main_units}": (10 ** 18) ** __degree,
-        f"З{__main_units}": (10 ** 21) ** __degree,
-        f"И{__main_units}": (10 ** 24) ** __degree,
-        f"д{__main_units}": (10 ** -1) ** __degree,
-        f"с{__main_units}": (10 ** -2) ** __degree,
-        f"м{__main_units}": (10 ** -3) ** __degree,
-        f"мк{__main_units}": (10 ** -6) ** __degree,
-        f"н{__main_units}": (10 ** -9) ** __degree,
-        f"п{__main_units}": (10 ** -12) ** __degree,
-        f"ф{__main_units}": (10 ** -15) ** __degree,
-        f"а{__main_units}": (10 ** -18) ** __degree,
-        f"з{__main_units}": (10 ** -21) ** __degree,
-        f"и{__main_units}": (10 ** -24) ** __degree,
-    }
-    __units2 = {
-        (10 ** 0) ** __degree: f"{__main_units}",
-        (10 ** 1) ** __degree: f"да{__main_units}",
-        (10 ** 2) ** __degree: f"г{__main_units}",
-        (10 ** 3) ** __degree: f"к{__main_units}",
-        (10 ** 6) ** __degree: f"М{__main_units}", (10 ** 6) ** __degree: f"т",
-        (10 ** 9) ** __degree: f"Г{__main_units}",
-        (10 ** 12) ** __degree: f"Т{__main_units}",
-        (10 ** 15) ** __degree: f"П{__main_units}",
-        (10 ** 18) ** __degree: f"Э{__main_units}",
-        (10 ** 21) ** __degree: f"З{__main_units}",
-        (10 ** 24) ** __degree: f"И{__main_units}",
-        (10 ** -1) ** __degree: f"д{__main_units}",
-        (10 ** -2) ** __degree: f"с{__main_units}",
-        (10 ** -3) ** __degree: f"м{__main_units}",
-        (10 ** -6) ** __degree: f"мк{__main_units}",
-        (10 ** -9) ** __degree: f"н{__main_units}",
-        (10 ** -12) ** __degree: f"п{__main_units}",
-        (10 ** -15) ** __degree: f"ф{__main_units}",
-        (10 ** -18) ** __degree: f"а{__main_units}",
-        (10 ** -21) ** __degree: f"з{__main_units}",
-        (10 ** -24) ** __degree: f"и{__main_units}"
-    }
-
-    def __init__(self, weight: str):
-        import re
-        weight = re.fullmatch(r'\s*[+-]?(?P<number>\d+[.]?\d*)\s*(?P<unit>\w+)\s*', weight.replace(",", "."))
-        if not weight or not weight.group("number").replace(".", "").isnumeric() or \
-                not self.__units.get(weight.group("unit")):
-            raise ValueError("Weight is not correct")
-        self.__unit = self.__units[weight.group("unit")]
-        self.__number = \
-            int(weight.group("number")) if weight.group("number").isnumeric() else float(weight.group("number"))
-
-    def get_mass(self, unit_of_mass: str = None):
-        if unit_of_mass is None:
-            unit = self.__unit
-        else:
-            unit = self.__units[unit_of_mass]
-
-        result = self.__number * (self.__unit / unit)
-        result = int(result) if int(result) == result else result
-        return result
+import re
+import math
+from fractions import Fraction
+from decimal import Decimal, localcontext, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Union
 
-    def __str__(self):
-        return f"{self.__number}{self.__units2[self.__unit]}"
+# Приставки СИ и степени десяти
+prefixes = {
+    "": 0, "да": 1, "г": 2, "к": 3, "М": 6, "Г": 9, "Т": 12, "П": 15, "Э": 18, "З": 21, "И": 24,
+    "д": -1, "с": -2, "м": -3, "мк": -6, "н": -9, "п": -12, "ф": -15, "а": -18, "з": -21, "и": -24,
+}
 
-    def __repr__(self):
-        return f"{self.__number}{self.__units2[self.__unit]}"
-
-
-class Volume:
-    __degree = 3
-    __main_units = "м³"
-    __units = {
-        __main_units: (10 ** 0) ** __degree,
-        f"да{__main_units}": (10 ** 1) ** __degree,
-        f"г{__main_units}": (10 ** 2) ** __degree,
-        f"к{__main_units}": (10 ** 3) ** __degree,
-        f"М{__main_units}": (10 ** 6) ** __degree,
-        f"Г{__main_units}": (10 ** 9) ** __degree,
-        f"Т{__main_units}": (10 ** 12) ** __degree,
-        f"П{__main_units}": (10 ** 15) ** __degree,
-        f"Э{__main_units}": (10 ** 18) ** __degree,
-        f"З{__main_units}": (10 ** 21) ** __degree,
-        f"И{__main_units}": (10 ** 24) ** __degree,
-        f"д{__main_units}": (10 ** -1) ** __degree, f"л": (10 ** -1) ** __degree,
-        f"с{__main_units}": (10 ** -2) ** __degree, f"мл": (10 ** -2) ** __degree,
-        f"м{__main_units}": (10 ** -3) ** __degree,
-        f"мк{__main_units}": (10 ** -6) ** __degree,
-        f"н{__main_units}": (10 ** -9) ** __degree,
-        f"п{__main_units}": (10 ** -12) ** __degree,
-        f"ф{__main_units}": (10 ** -15) ** __degree,
-        f"а{__main_units}": (10 ** -18) ** __degree,
-        f"з{__main_units}": (10 ** -21) ** __degree,
-        f"и{__main_units}": (10 ** -24) ** __degree,
-    }
-    __units2 = {
-        (10 ** 0) ** __degree: f"{__main_units}",
-        (10 ** 1) ** __degree: f"да{__main_units}",
-        (10 ** 2) ** __degree: f"г{__main_units}",
-        (10 ** 3) ** __degree: f"к{__main_units}",
-        (10 ** 6) ** __degree: f"М{__main_units}",
-        (10 ** 9) ** __degree: f"Г{__main_units}",
-        (10 ** 12) ** __degree: f"Т{__main_units}",
-        (10 ** 15) ** __degree: f"П{__main_units}",
-        (10 ** 18) ** __degree: f"Э{__main_units}",
-        (10 ** 21) ** __degree: f"З{__main_units}",
-        (10 ** 24) ** __degree: f"И{__main_units}",
-        (10 ** -1) ** __degree: f"д{__main_units}", (10 ** -1) ** __degree: f"л",
-        (10 ** -2) ** __degree: f"с{__main_units}", (10 ** -2) ** __degree: f"мл",
-        (10 ** -3) ** __degree: f"м{__main_units}",
-        (10 ** -6) ** __degree: f"мк{__main_units}",
-        (10 ** -9) ** __degree: f"н{__main_units}",
-        (10 ** -12) ** __degree: f"п{__main_units}",
-        (10 ** -15) ** __degree: f"ф{__main_units}",
-        (10 ** -18) ** __degree: f"а{__main_units}",
-        (10 ** -21) ** __degree: f"з{__main_units}",
-        (10 ** -24) ** __degree: f"и{__main_units}"
-    }
-
-    def __init__(self, volume: str):
-        import re
-        volume = re.fullmatch(r'\s*[+-]?(?P<number>\d+[.]?\d*)\s*(?P<unit>\w+)\s*', volume.replace(",", "."))
-        if not volume or not volume.group("number").replace(".", "").isnumeric() or \
-                not self.__units.get(volume.group("unit")):
-            raise ValueError("Volume is not correct")
-        self.__unit = self.__units[volume.group("unit")]
-        self.__number = \
-            int(volume.group("number")) if volume.group("number").isnumeric() else float(volume.group("number"))
-
-    def get_volume(self, unit_of_mass: str = None):
-        if unit_of_mass is None:
-            unit = self.__unit
-        else:
-            unit = self.__units[unit_of_mass]
-
-        result = self.__number * (self.__unit / unit)
-        result = int(result) if int(result) == result else result
-        return result
+numbers_to_superscript = str.maketrans("0123456789-", "⁰¹²³⁴⁵⁶⁷⁸⁹⁻")
+
+quantity_pattern = re.compile(r'\s*(?P<sign>[+-]?)(?P<number>\d+[.]?\d*)\s*(?P<unit>[^\s\d].*?)\s*')
+
+
+# Единица со всеми приставками; degree - степень единицы (для м³ приставка возводится в куб)
+def prefixed(unit: str, degree: int = 1, factor: Union[int, Fraction] = 1) -> dict[str, Union[int, Fraction]]:
+    return {prefix + unit: factor * Fraction(10) ** (power * degree) for prefix, power in prefixes.items()}
+
+
+# Одни и те же строки (10г, 22.4л) приходят постоянно, поэтому результат разбора кэшируется
+@lru_cache(maxsize=1024)
+def parse_quantity(string: str) -> Union[tuple[int, Union[int, float], str], None]:
+    match = quantity_pattern.fullmatch(string.replace(",", "."))
+    if not match:
+        return None
+    number = int(match["number"]) if match["number"].isnumeric() else float(match["number"])
+    return -1 if match["sign"] == "-" else 1, number, match["unit"]
+
+
+# Величина с числом и единицей измерения. units - множители единиц относительно основной, offsets - сдвиги
+# шкалы (для температуры), те и другие точные (int или Fraction). Знак учитывается только у величин с signed = True
+class Quantity:
+    __slots__ = ('_number', '_unit')
+    units: dict[str, Union[int, Fraction]] = {}
+    offsets: dict[str, Union[int, Fraction]] = {}
+    signed = False
+
+    def __init__(self, string: str):
+        quantity = parse_quantity(string)
+        if quantity is None or quantity[2] not in self.units:
+            raise ValueError(f"{type(self).__name__} is not correct")
+        sign, self._number, self._unit = quantity
+        if self.signed:
+            self._number *= sign
+
+    # Перевод считается точно, поэтому 1 л - ровно 1000 мл, а -40 °C - ровно -40 °F. exact=True - результат
+    # в Fraction, иначе - int или ближайший к точному значению float
+    def get(self, unit: str = None, exact: bool = False) -> Union[int, float, Fraction]:
+        if unit is None:
+            unit = self._unit
+        result = convert_exact(type(self), self._number, self._unit, unit)
+        if exact:
+            return result
+        return int(result) if result.denominator == 1 else float(result)
 
     def __str__(self):
-        return f"{self.__number}{self.__units2[self.__unit]}"
+        return f"{self._number}{self._unit}"
 
     def __repr__(self):
-        return f"{self.__number}{self.__units2[self.__unit]}"
+        return f"{self._number}{self._unit}"
+
+
+class Weight(Quantity):
+    __slots__ = ()
+    units = {**prefixed("г"), "т": 10 ** 6}
+    get_mass = Quantity.get
+
+
+class Volume(Quantity):
+    __slots__ = ()
+    units = {**prefixed("м³", 3), "л": Fraction(1, 10 ** 3), "мл": Fraction(1, 10 ** 6)}
+    get_volume = Quantity.get
+
+
+class Length(Quantity):
+    __slots__ = ()
+    units = prefixed("м")
+    get_length = Quantity.get
 
 
+class Time(Quantity):
+    __slots__ = ()
+    units = {**prefixed("с"), "мин": 60, "ч": 60 * 60, "сут": 24 * 60 * 60}
+    get_time = Quantity.get
+
+
+class Temperature(Quantity):
+    __slots__ = ()
+    units = {"К": 1, "°C": 1, "°С": 1, "℃": 1, "°F": Fraction(5, 9)}
+    offsets = {"°C": Fraction("273.15"), "°С": Fraction("273.15"), "℃": Fraction("273.15"),
+               "°F": Fraction("273.15") - 32 * Fraction(5, 9)}
+    signed = True
+    get_temperature = Quantity.get
+
+
+class Energy(Quantity):
+    __slots__ = ()
+    units = {**prefixed("Дж"), "кал": Fraction("4.1868"), "ккал": Fraction("4186.8"), "эВ": Fraction("1.602176634e-19"),
+             "кВт·ч": 36 * 10 ** 5}
+    get_energy = Quantity.get
+
+
+class Pressure(Quantity):
+    __slots__ = ()
+    units = {**prefixed("Па"), "бар": 10 ** 5, "атм": 101325, "мм рт. ст.": Fraction("133.322")}
+    get_pressure = Quantity.get
+
+
+class Density(Quantity):
+    __slots__ = ()
+    units = {"кг/м³": 1, "г/м³": Fraction(1, 10 ** 3), "г/см³": 10 ** 3, "кг/дм³": 10 ** 3, "г/л": 1, "кг/л": 10 ** 3,
+             "г/мл": 10 ** 3, "т/м³": 10 ** 3}
+    get_density = Quantity.get
+
+
+# Точный перевод числа из одной единицы в другую. Кэшируется, как и parse_quantity: значения повторяются
+@lru_cache(maxsize=1024)
+def convert_exact(quantity: type[Quantity], number: Union[int, float], unit: str, target: str) -> Fraction:
+    offset, target_offset = quantity.offsets.get(unit, 0), quantity.offsets.get(target, 0)
+    return (to_exact(number) * quantity.units[unit] + offset - target_offset) / quantity.units[target]
+
+
+# Число в точном виде по его десятичной записи: to_exact(0.1) == Fraction(1, 10), а не ближайшая двоичная дробь
+def to_exact(number: Union[int, float, str, Decimal, Fraction]) -> Fraction:
+    return Fraction(repr(number)) if isinstance(number, float) else Fraction(number)
+
+
+# Округление до 5 знаков после запятой. Для float - быстрый путь в машинных числах, Fraction и Decimal
+# округляются точно (половина - вверх)
 def round(number):
-    import math
+    if isinstance(number, (Fraction, Decimal)):
+        scaled = math.floor(Fraction(number) * 10 ** 5 + Fraction(1, 2))
+        return scaled // 10 ** 5 if scaled % 10 ** 5 == 0 else float(Fraction(scaled, 10 ** 5))
     result = math.floor(number * 10 ** 5 + 0.5) / 10 ** 5
     return int(result) if int(result) == result else result
+
+
+# Число для ответа: обычные значения - как round, очень маленькие (где от 5 знаков после запятой не остается
+# значащих цифр) и начиная с limit - с figures значащими цифрами: 4.9834 * 10⁻²⁴
+def render(number: Union[int, float, Fraction, Decimal], figures: int = 5,
+           limit: Union[int, float] = 10 ** 15) -> str:
+    if number == 0 or 10 ** -3 <= abs(number) < limit:
+        return str(round(number))
+    with localcontext() as context:
+        context.rounding = ROUND_HALF_UP
+        if isinstance(number, Fraction):
+            number = Decimal(number.numerator) / Decimal(number.denominator)
+        mantissa, exponent = f"{Decimal(repr(number)) if isinstance(number, float) else number:.{figures - 1}e}" \
+            .split("e")
+    mantissa = mantissa.rstrip("0").rstrip(".")
+    return f"{mantissa} * 10{str(int(exponent)).translate(numbers_to_superscript)}"
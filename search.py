@@ -0,0 +1,120 @@
+from typing import Union, Iterable
+
+
+# Расстояние Левенштейна битово-параллельным алгоритмом Майерса (Хюрё): столбец таблицы расстояний хранится
+# разностями соседних клеток в битах целого числа, поэтому на каждую букву - несколько операций с числами
+def levenshtein(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    masks = {}
+    for i, char in enumerate(b):
+        masks[char] = masks.get(char, 0) | 1 << i
+    full = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    positive, negative, distance = full, 0, len(b)
+    for char in a:
+        equal = masks.get(char, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        horizontal_positive = negative | ~(horizontal | positive) & full
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last:
+            distance += 1
+        elif horizontal_negative & last:
+            distance -= 1
+        horizontal_positive = (horizontal_positive << 1 | 1) & full
+        horizontal_negative = (horizontal_negative << 1) & full
+        positive = horizontal_negative | ~(vertical | horizontal_positive) & full
+        negative = horizontal_positive & vertical
+    return distance
+
+
+# Префиксное дерево: дополнение недописанных слов
+class Trie:
+    __slots__ = ('_root',)
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root = {}
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        node = self._root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = word
+
+    def complete(self, prefix: str, limit: int = 10) -> list[str]:
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        result = []
+        stack = [node]
+        while stack and len(result) < limit:
+            node = stack.pop()
+            for char, child in node.items():
+                if char is None:
+                    result.append(child)
+                else:
+                    stack.append(child)
+        return result[:limit]
+
+
+# BK-дерево по расстоянию Левенштейна: поиск слов на расстоянии не больше заданного без перебора словаря
+class BKTree:
+    __slots__ = ('_root',)
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root: Union[tuple[str, dict], None] = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (word, {})
+                return
+            node = node[1][distance]
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str]]:
+        result = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_word, children = stack.pop()
+            distance = levenshtein(word, node_word)
+            if distance <= max_distance:
+                result.append((distance, node_word))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(result)
+
+
+class Vocabulary:
+    __slots__ = ('words', '_trie', '_tree')
+
+    def __init__(self, words: Iterable[str]):
+        self.words = frozenset(words)
+        self._trie = Trie(self.words)
+        self._tree = BKTree(self.words)
+
+    # Похожие слова с расстоянием: точное совпадение, опечатки (примерно одна на три буквы) и недописанные слова
+    def match(self, word: str, limit: int = 3) -> list[tuple[int, str]]:
+        if word in self.words:
+            return [(0, word)]
+        matches = dict((match, distance) for distance, match in self._tree.search(word, max(1, len(word) // 3)))
+        if len(word) >= 3:
+            for match in self._trie.complete(word, limit):
+                matches.setdefault(match, 1)
+        return sorted((distance, match) for match, distance in matches.items())[:limit]
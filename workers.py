@@ -0,0 +1,192 @@
+import os
+import signal
+import asyncio
+import multiprocessing
+from multiprocessing import reduction
+from typing import Union, Callable, Any
+from multiprocessing.connection import Pipe, Connection
+
+
+class TooComplex(Exception):
+    pass
+
+
+def worker_loop(conn: Connection):
+    while True:
+        try:
+            function, args = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        try:
+            result = (True, function(*args))
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:  # Результат или исключение не удалось передать (например, не сериализуется)
+            conn.send((False, RuntimeError(f"{e.__class__.__name__}: {e}")))
+
+
+# Процесс, который создает и завершает рабочие процессы. Он запускается до того, как у бота появятся потоки
+# (aiosqlite, цикл событий), и сам потоков не создает, поэтому fork в нем безопасен и во время работы бота:
+# в дочернем процессе не останется блокировки, захваченной другим потоком
+def spawner_loop(conn: Connection, bot_conn: Connection):
+    bot_conn.close()  # Иначе канал не закроется, когда его закроет бот
+    while True:
+        try:
+            command, pid = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if command == "kill":
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            conn.send(None)
+            continue
+        parent_conn, child_conn = Pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                conn.close()
+                parent_conn.close()
+                worker_loop(child_conn)
+            finally:
+                os._exit(0)
+        child_conn.close()
+        conn.send(pid)
+        reduction.send_handle(conn, parent_conn.fileno(), os.getppid())  # Конец канала передается боту
+        parent_conn.close()
+
+
+class Worker:
+    __slots__ = ('pid', 'conn', '_spawner')
+
+    def __init__(self, spawner: Connection):
+        spawner.send(("spawn", None))
+        self.pid = spawner.recv()
+        self.conn = Connection(reduction.recv_handle(spawner))
+        self._spawner = spawner
+
+    def kill(self) -> None:
+        self._spawner.send(("kill", self.pid))
+        self._spawner.recv()
+        self.conn.close()
+
+
+# Пул процессов для тяжелых вычислений: каждое задание ограничено по времени, процесс, не уложившийся
+# в timeout, завершается и заменяется новым, а вызывающий получает TooComplex
+class ProcessPool:
+    def __init__(self, size: int = 2, timeout: float = 3):
+        self.size = size
+        self.timeout = timeout
+        self._spawner: Union[multiprocessing.Process, None] = None
+        self._spawner_conn: Union[Connection, None] = None
+        self._idle: Union[asyncio.Queue, None] = None
+        self._workers: set[Worker] = set()
+        self.queued = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    def start(self) -> None:
+        if self.started:
+            return
+        # Рабочие процессы получают уже загруженные модули: их создает fork процесса spawner_loop
+        context = multiprocessing.get_context("fork")
+        self._spawner_conn, child_conn = Pipe()
+        self._spawner = context.Process(target=spawner_loop, args=(child_conn, self._spawner_conn),
+                                        daemon=True)
+        self._spawner.start()
+        child_conn.close()
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(self._spawn())
+
+    def _spawn(self) -> Worker:
+        worker = Worker(self._spawner_conn)
+        self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker: Worker) -> Worker:
+        if not self.started:  # Пул остановлен, процессы уже завершены в stop
+            return worker
+        self._workers.discard(worker)
+        worker.kill()
+        self.restarts += 1
+        return self._spawn()
+
+    async def run(self, function: Callable, *args) -> Any:
+        if not self.started:
+            return function(*args)
+
+        # timeout отсчитывается с постановки в очередь: ожидание свободного процесса входит в то же время
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        if not self._idle.empty():
+            worker = self._idle.get_nowait()
+        else:  # Свободных процессов нет: только такие задания считаются стоящими в очереди
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                worker = await asyncio.wait_for(self._idle.get(), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise TooComplex("Calculation time limit exceeded") from None
+            finally:
+                self.queued -= 1
+
+        future = loop.create_future()
+
+        def ready():
+            loop.remove_reader(worker.conn.fileno())
+            if future.done():
+                return
+            try:
+                future.set_result(worker.conn.recv())
+            except Exception as e:  # Процесс завершился аварийно
+                future.set_exception(e)
+
+        try:
+            worker.conn.send((function, args))
+            loop.add_reader(worker.conn.fileno(), ready)
+            ok, result = await asyncio.wait_for(future, deadline - loop.time())
+        except BaseException as e:
+            if not worker.conn.closed:
+                loop.remove_reader(worker.conn.fileno())
+            worker = self._replace(worker)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise TooComplex("Calculation time limit exceeded") from None
+            raise
+        finally:
+            if self._idle is not None:
+                self._idle.put_nowait(worker)
+
+        self.completed += 1
+        if not ok:
+            raise result
+        return result
+
+    def stats(self) -> dict[str, int]:
+        return {"size": self.size,
+                "busy": self.size - self._idle.qsize() if self.started else 0,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts}
+
+    async def stop(self) -> None:
+        if not self.started:
+            return
+        self._idle = None
+        for worker in self._workers:
+            worker.kill()
+        self._workers.clear()
+        self._spawner_conn.close()
+        self._spawner.join()
+        self._spawner = self._spawner_conn = None